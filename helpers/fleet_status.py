@@ -0,0 +1,123 @@
+from threading import RLock
+
+# Seconds to collect changes of further instances before the status entity is written
+PUBLISH_DELAY = 1
+
+
+class FleetStatus:
+    """
+    Singleton aggregated status entity for all blinds and shutter instances.
+
+    Instances report a compact status (state, target, locks, last command) after every evaluation. Only
+    reports which differ from the last one mark the entity as changed, and all changes within PUBLISH_DELAY
+    are written with one set_state - dashboards and automations read one entity and the recorder stores one
+    row per batch instead of one per instance entity. Metrics of instances (e.g. latency histograms) are
+    published with the next write, but don't cause a write on their own.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FleetStatus, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'entities'):
+            # status entity id -> key of instance -> status
+            self.entities = {}
+            # status entity id -> key of instance -> metrics
+            self.metrics = {}
+            # status entity id -> keys changed since last publish
+            self.changed = {}
+            # app -> (status entity id, key)
+            self.members = {}
+            self.owner = None
+            self.scheduled = False
+            self.lock = RLock()
+            self.stats = {"reports": 0, "unchanged": 0, "publishes": 0}
+            # Callables returning statistics published with every status (e.g. shared services)
+            self.stats_sources = {}
+
+    def report(self, app, entity_id: str, key: str, status: dict, metrics: dict = None):
+        """
+        Report status of an instance. Written with the next batch when it differs from the last report.
+
+        Args:
+            app: The AppDaemon app reporting (also used for writing when no other app does)
+            entity_id: Entity id of status entity, e.g. sensor.blinds_status
+            key: Key of instance in the status map (unique_id or name)
+            status: JSON serializable status
+            metrics: Optional JSON serializable metrics, published with the next write of the status
+        """
+        with self.lock:
+            self.stats['reports'] += 1
+            self.members[app] = (entity_id, key)
+            if metrics is not None:
+                self.metrics.setdefault(entity_id, {})[key] = metrics
+            covers = self.entities.setdefault(entity_id, {})
+            if covers.get(key) == status:
+                self.stats['unchanged'] += 1
+                return
+            covers[key] = status
+            self.changed.setdefault(entity_id, set()).add(key)
+            if self.owner is None:
+                self.owner = app
+            self._schedule()
+
+    def add_stats_source(self, name: str, source):
+        """
+        Publish statistics of a shared service with the status.
+
+        Args:
+            name: Name of attribute
+            source: Callable returning a JSON serializable dict
+        """
+        self.stats_sources[name] = source
+
+    def unregister(self, app):
+        """
+        Remove an instance from the status. When it owned the writes, another instance takes over.
+
+        Args:
+            app: The AppDaemon app to remove
+        """
+        with self.lock:
+            member = self.members.pop(app, None)
+            if member is not None:
+                entity_id, key = member
+                self.metrics.get(entity_id, {}).pop(key, None)
+                if self.entities.get(entity_id, {}).pop(key, None) is not None:
+                    self.changed.setdefault(entity_id, set()).add(key)
+            if self.owner is app:
+                self.owner = next(iter(self.members), None)
+                # Scheduled write was removed together with the app
+                self.scheduled = False
+                self._schedule()
+
+    def _schedule(self):
+        if self.scheduled or self.owner is None or not self.changed:
+            return
+        self.scheduled = True
+        self.owner.run_in(self.publish, PUBLISH_DELAY)
+
+    def publish(self, kwargs=None):
+        """Write all changed status entities."""
+        with self.lock:
+            self.scheduled = False
+            changed = self.changed
+            self.changed = {}
+            writes = [(entity_id, dict(self.entities.get(entity_id, {})), dict(self.metrics.get(entity_id, {})), sorted(keys))
+                      for entity_id, keys in changed.items()]
+            owner = self.owner
+        if owner is None:
+            return
+        stats = {name: source() for name, source in self.stats_sources.items()}
+        for entity_id, covers, metrics, keys in writes:
+            owner.set_state(entity_id, state=len(covers), attributes={
+                "covers": covers,
+                "metrics": metrics,
+                "changed": keys,
+                "stats": stats,
+            })
+            self.stats['publishes'] += 1
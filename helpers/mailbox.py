@@ -0,0 +1,82 @@
+import itertools
+import time
+from collections import deque
+from threading import Lock
+from typing import Callable
+
+
+class Mailbox:
+    """
+    Single consumer mailbox of one blinds or shutter instance.
+
+    Callbacks of any thread post messages (sensor updates, boolean toggles, timer expiries, ticks) without locking.
+    One drain is scheduled on the thread of the owning app which takes all pending messages, coalesces them
+    by (kind, key) - latest value wins - and hands them over to the handler in one call.
+
+    The drain runs a debounce window after the first message of a burst (the window is not extended by
+    further messages, so the latency is bounded by it). Urgent messages schedule an immediate drain.
+    """
+
+    def __init__(self, app, handler: Callable[[dict, dict], None], debounce: float = 0):
+        """
+        Args:
+            app: The AppDaemon app owning the mailbox. Drains are scheduled with its run_in
+            handler: Called with dict (kind, key) -> value of all coalesced messages and
+                dict (kind, key) -> time.monotonic() of first post of the message
+            debounce: Seconds to wait for further messages before draining
+        """
+        self.app = app
+        self.handler = handler
+        self.debounce = debounce
+        self.queue = deque()
+        self.scheduled = False
+        self.scheduled_urgent = False
+        self.consumer = Lock()
+        self.sequence = itertools.count()
+        self.stats = {"posted": 0, "urgent": 0, "drains": 0, "coalesced": 0}
+
+    def post(self, kind: str, key=None, value=None, coalesce: bool = True, urgent: bool = False):
+        """
+        Post a message. Deque append is atomic, so no lock is needed.
+
+        Args:
+            kind: Message kind, e.g. "tick", "state", "window"
+            key: Optional key (e.g. entity id). Messages with same kind and key are coalesced
+            value: Optional payload
+            coalesce: When False, the message is always delivered on its own
+            urgent: Drain immediately without debounce window (safety relevant triggers)
+        """
+        if not coalesce:
+            key = (key, next(self.sequence))
+        self.queue.append((kind, key, value, time.monotonic()))
+        self.stats['posted'] += 1
+        if urgent:
+            self.stats['urgent'] += 1
+            if not self.scheduled_urgent:
+                self.scheduled = True
+                self.scheduled_urgent = True
+                self.app.run_in(self.drain, 0)
+        elif not self.scheduled:
+            self.scheduled = True
+            self.app.run_in(self.drain, self.debounce)
+
+    def drain(self, kwargs=None):
+        """Take all pending messages and hand them to the handler. Runs on the thread of the owning app."""
+        with self.consumer:
+            # Reset before taking messages - a message posted from now on schedules a new drain
+            self.scheduled = False
+            self.scheduled_urgent = False
+            messages = {}
+            posted = {}
+            count = 0
+            while self.queue:
+                kind, key, value, posted_at = self.queue.popleft()
+                messages[(kind, key)] = value
+                posted.setdefault((kind, key), posted_at)
+                count += 1
+            if not messages:
+                # Already taken by an earlier drain (e.g. urgent drain while debounced drain was pending)
+                return
+            self.stats['drains'] += 1
+            self.stats['coalesced'] += count - len(messages)
+            self.handler(messages, posted)
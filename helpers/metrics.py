@@ -0,0 +1,85 @@
+import bisect
+from threading import Lock
+
+# Upper bounds of histogram buckets in milliseconds
+LATENCY_BUCKETS_MS = (50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class LatencyHistogram:
+    """
+    Fixed bucket histogram for latencies (e.g. trigger to command).
+    Observing is O(log buckets), no samples are kept.
+    """
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        # Last bucket counts everything above highest bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        """Add a latency measured in seconds."""
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def as_dict(self) -> dict:
+        """
+        Histogram as dict, e.g. for logging or attributes in HASS.
+
+        Returns:
+            Dict with count, mean, max and counts per bucket ("<=50", ..., ">10000")
+        """
+        buckets = {f"<={bound}": count for bound, count in zip(self.buckets, self.counts)}
+        buckets[f">{self.buckets[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else None,
+            "max_ms": round(self.max_ms, 1),
+            "buckets": buckets,
+        }
+
+
+class ConcurrencyGauge:
+    """
+    Number of callbacks running at the same time (e.g. evaluations of all instances).
+    Used as context manager around the measured callback.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.current = 0
+        self.peak = 0
+        self.total = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.current += 1
+            self.total += 1
+            if self.current > self.peak:
+                self.peak = self.current
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.lock:
+            self.current -= 1
+        return False
+
+    def reset_peak(self) -> int:
+        """Start a new measurement window. Returns peak of the finished window."""
+        with self.lock:
+            peak = self.peak
+            self.peak = self.current
+            return peak
+
+    def as_dict(self) -> dict:
+        return {"current": self.current, "peak": self.peak, "total": self.total}
+
+
+# Evaluations (runs of main) of all blinds and shutter instances
+EVALUATIONS = ConcurrencyGauge()
@@ -0,0 +1,141 @@
+from threading import RLock
+
+# Seconds after a write until unconfirmed entities are compared with HASS
+RECONCILE_DELAY = 5
+# States of HASS which are no answer to a write
+NO_STATE = frozenset({None, "unknown", "unavailable"})
+
+
+class Publisher:
+    """
+    Publishes the internal input_booleans of one blinds or shutter instance to HASS.
+
+    Keeps a local mirror of the wanted state and of the state last known in HASS, so lock handling never
+    reads back after a write. A write equal to the state in HASS is suppressed - every sent write is a
+    row in the recorder database. While the publisher is held (one evaluation), several writes of the same
+    entity are coalesced and only the last one is sent when it is released.
+
+    A write is confirmed when set_state returns the written state or HASS reports a state of the entity
+    afterwards. Only writes which failed or stayed unconfirmed are compared with HASS after RECONCILE_DELAY
+    seconds and written again when HASS shows a different state.
+    """
+
+    def __init__(self, app):
+        """
+        Args:
+            app: The AppDaemon app owning the entities. Writes and reconcile timer use its API
+        """
+        self.app = app
+        # entity_id -> state wanted by the logic
+        self.wanted = {}
+        # entity_id -> state last written to or reported by HASS
+        self.known = {}
+        # entity_id -> state to be sent on release
+        self.outbox = {}
+        self.held = 0
+        # entity_id -> state written but neither returned by set_state nor reported by HASS
+        self.unconfirmed = {}
+        self.reconcile_scheduled = False
+        # Service calls are dispatched from the thread of another instance
+        self.lock = RLock()
+        self.stats = {"requested": 0, "sent": 0, "suppressed": 0, "coalesced": 0, "failed": 0, "reconciled": 0}
+
+    def __enter__(self):
+        with self.lock:
+            self.held += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self.lock:
+            self.held -= 1
+        self.flush()
+
+    def set(self, entity_id: str, state: str):
+        """
+        Set an input_boolean. Sent at once or - while held - on release.
+
+        Args:
+            entity_id: Entity id of input_boolean
+            state: STATE_ON or STATE_OFF
+        """
+        with self.lock:
+            self.stats['requested'] += 1
+            self.wanted[entity_id] = state
+            if entity_id in self.outbox:
+                # Replaces a write of this evaluation which was not sent yet
+                self.stats['coalesced'] += 1
+                del self.outbox[entity_id]
+            if self.known.get(entity_id) == state:
+                self.stats['suppressed'] += 1
+                return
+            self.outbox[entity_id] = state
+            held = self.held > 0
+        if not held:
+            self.flush()
+
+    def observed(self, entity_id: str, state: str):
+        """
+        Record a state reported by HASS (state change or service call of an input_boolean).
+
+        Args:
+            entity_id: Entity id of input_boolean
+            state: State in HASS
+        """
+        with self.lock:
+            self.known[entity_id] = state
+            # Mirror is up to date again - nothing to reconcile
+            self.unconfirmed.pop(entity_id, None)
+            if entity_id not in self.outbox:
+                self.wanted[entity_id] = state
+
+    def flush(self):
+        """Send all pending writes."""
+        with self.lock:
+            if self.held > 0 or not self.outbox:
+                return
+            outbox = self.outbox
+            self.outbox = {}
+            for entity_id, state in outbox.items():
+                self.known[entity_id] = state
+            self.unconfirmed.update(outbox)
+            self.stats['sent'] += len(outbox)
+        confirmed = []
+        failed = 0
+        for entity_id, state in outbox.items():
+            try:
+                result = self.app.set_state(entity_id=entity_id, state=state)
+            except Exception as e:
+                self.app.debug(f"Writing {state} to {entity_id} failed: {e!r}")
+                failed += 1
+                continue
+            if isinstance(result, dict) and result.get('state') == state:
+                confirmed.append((entity_id, state))
+        with self.lock:
+            self.stats['failed'] += failed
+            for entity_id, state in confirmed:
+                # Still unconfirmed when written again in the meantime
+                if self.unconfirmed.get(entity_id) == state:
+                    del self.unconfirmed[entity_id]
+            schedule = bool(self.unconfirmed) and not self.reconcile_scheduled
+            if schedule:
+                self.reconcile_scheduled = True
+        if schedule:
+            self.app.run_in(self.reconcile, RECONCILE_DELAY)
+
+    def reconcile(self, kwargs=None):
+        """Compare unconfirmed entities with HASS and write again where a write got lost."""
+        with self.lock:
+            self.reconcile_scheduled = False
+            unconfirmed = list(self.unconfirmed)
+            self.unconfirmed = {}
+        for entity_id in unconfirmed:
+            actual = self.app.get_state(entity_id)
+            if actual in NO_STATE:
+                continue
+            with self.lock:
+                wanted = self.wanted.get(entity_id)
+                self.known[entity_id] = actual
+            if wanted is not None and actual != wanted:
+                self.app.debug(f"{entity_id} is {actual} in HASS but {wanted} locally - write again")
+                self.stats['reconciled'] += 1
+                self.set(entity_id, wanted)
@@ -0,0 +1,308 @@
+import time
+from threading import RLock
+from typing import Callable, Iterable
+
+from helpers.signal_filter import RunningVariance, SignalFilter
+
+UNAVAILABLE = 'unavailable'
+UNKNOWN = 'unknown'
+INVALID_STATES = frozenset({UNKNOWN, UNAVAILABLE})
+
+
+def int_value(value) -> int:
+    """Parser used for brightness sensors."""
+    return int(float(value))
+
+
+def alarm_value(value) -> float:
+    """Parser used for weather alarm sensors. Binary sensors are mapped to 1 (on) and 0 (off)."""
+    if value == "on":
+        return 1.0
+    if value == "off":
+        return 0.0
+    return float(value)
+
+
+class SensorHub:
+    """
+    Singleton class sharing sensor subscriptions (brightness, temperature, ...) between all blinds and shutter instances.
+    Every entity is listened once, every update is parsed once and stored in a shared cache.
+    Instances read values from the cache and are only notified when one of their thresholds was crossed.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SensorHub, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'sensors'):
+            # (entity_id, attribute) -> sensor dict with owner, handle, parser and subscribers
+            self.sensors = {}
+            # (entity_id, attribute) -> last parsed value. Shared read-only cache for instances
+            self.values = {}
+            self.lock = RLock()
+            self.started = time.monotonic()
+            self.received = 0
+            self.notified = 0
+            self.fanout = 0
+            # (entity_id, attribute) -> volatility window -> RunningVariance. Kept while a sensor is not listened,
+            # so the volatility survives resubscribes
+            self.variances = {}
+
+    def subscribe(self, app, entity_id: str, attribute: str = None, parser: Callable = int_value,
+                  callback: Callable = None, thresholds: Callable[[], Iterable[float]] = None, signal_filter: dict = None,
+                  volatility_window: int = None):
+        """
+        Subscribe an instance to a sensor. The first subscriber listens to HASS on behalf of all others.
+
+        Args:
+            app: The AppDaemon app subscribing
+            entity_id: Sensor entity in HASS
+            attribute: Optional attribute of entity instead of state
+            parser: Converts the HASS state into the cached value (has to be the same for all subscribers)
+            callback: Optional callback(entity_id, old, new) when a threshold was crossed
+            thresholds: Optional callable returning the actual thresholds of the instance.
+                When not defined, callback is called on every value change.
+            signal_filter: Optional SignalFilter arguments (method, window, percentile, alpha). The instance is
+                notified with and reads (see value) the filtered value. Subscribers with the same effective
+                arguments share one filter fed with the raw value
+            volatility_window: Optional number of raw samples for the running variance read by volatility.
+                Created when any subscriber asks for it and shared by subscribers with the same window
+
+        Returns:
+            Actual value of sensor (filtered for this subscriber)
+
+        Raises:
+            ValueError: When the sensor state could not be parsed on first read
+        """
+        key = (entity_id, attribute)
+        with self.lock:
+            sensor = self.sensors.get(key)
+            if sensor is None:
+                # filters: filter label -> shared filter, its last value and threshold crossings before/after filter
+                sensor = {"owner": None, "handle": None, "parser": parser, "subscribers": {}, "filters": {}}
+                self.sensors[key] = sensor
+            label = self._add_filter(key, signal_filter)
+            if volatility_window:
+                variances = self.variances.setdefault(key, {})
+                if volatility_window not in variances:
+                    variances[volatility_window] = RunningVariance(volatility_window)
+                    if self.values.get(key) is not None:
+                        variances[volatility_window].add(self.values[key])
+            sensor['subscribers'][app.name] = (app, callback, thresholds, label)
+            if sensor['owner'] is None:
+                try:
+                    self._listen(key, app)
+                except ValueError:
+                    self._drop_subscriber(key, app)
+                    raise
+            return self.value(entity_id, attribute, app)
+
+    def unsubscribe(self, app, entity_id: str = None, attribute: str = None):
+        """
+        Remove subscription of an instance. When no entity is given, all subscriptions of app are removed.
+
+        Args:
+            app: The AppDaemon app unsubscribing
+            entity_id: Sensor entity in HASS
+            attribute: Optional attribute of entity
+        """
+        with self.lock:
+            if entity_id is None:
+                keys = [key for key, sensor in self.sensors.items() if app.name in sensor['subscribers']]
+            else:
+                keys = [(entity_id, attribute)]
+            for key in keys:
+                self._drop_subscriber(key, app)
+
+    def is_subscribed(self, app, entity_id: str, attribute: str = None) -> bool:
+        sensor = self.sensors.get((entity_id, attribute))
+        return sensor is not None and app.name in sensor['subscribers']
+
+    def value(self, entity_id: str, attribute: str = None, app=None):
+        """
+        Return last cached value of sensor.
+
+        Args:
+            entity_id: Sensor entity in HASS
+            attribute: Optional attribute of entity
+            app: Subscriber whose filter applies. Raw value when not given or not subscribed with a filter
+        """
+        key = (entity_id, attribute)
+        with self.lock:
+            sensor = self.sensors.get(key)
+            subscriber = sensor['subscribers'].get(app.name) if sensor is not None and app is not None else None
+            if subscriber is None or subscriber[3] is None:
+                return self.values.get(key)
+            return sensor['filters'][subscriber[3]]['value']
+
+    def volatility(self, entity_id: str, window: int, attribute: str = None) -> float | None:
+        """
+        Volatility of a sensor subscribed with volatility_window.
+
+        Args:
+            entity_id: Sensor entity in HASS
+            window: volatility_window of subscription
+            attribute: Optional attribute of entity
+
+        Returns:
+            Coefficient of variation (standard deviation / mean) of the last raw samples or None when not known
+        """
+        with self.lock:
+            variance = self.variances.get((entity_id, attribute), {}).get(window)
+            if variance is None:
+                return None
+            return variance.coefficient_of_variation()
+
+    def stats(self) -> dict:
+        """
+        Callback statistics since start.
+
+        Returns:
+            Dict with counts and rates per minute. 'fanout' is the number of callbacks
+            the instances would have got with an own listener each.
+        """
+        minutes = max((time.monotonic() - self.started) / 60, 1 / 60)
+        with self.lock:
+            crossings = {entity_id: {label: dict(entry['crossings']) for label, entry in sensor['filters'].items()}
+                         for (entity_id, _), sensor in self.sensors.items() if sensor['filters']}
+        return {
+            "sensors": len(self.sensors),
+            "received": self.received,
+            "notified": self.notified,
+            "fanout": self.fanout,
+            "received_per_min": round(self.received / minutes, 1),
+            "notified_per_min": round(self.notified / minutes, 1),
+            "fanout_per_min": round(self.fanout / minutes, 1),
+            # Threshold crossings of raw and filtered values - flapping removed by filters
+            "crossings": crossings,
+        }
+
+    def _listen(self, key: tuple, app):
+        entity_id, attribute = key
+        sensor = self.sensors[key]
+        if attribute:
+            sensor['handle'] = app.listen_state(self.on_sensor_change, entity_id, attribute=attribute)
+        else:
+            sensor['handle'] = app.listen_state(self.on_sensor_change, entity_id)
+        sensor['owner'] = app
+        # Catch up with actual state - changes could be missed while nobody was listening
+        state = app.get_state(entity_id, attribute=attribute) if attribute else app.get_state(entity_id)
+        if state is None or state in INVALID_STATES:
+            return
+        self._sample(key, sensor['parser'](state))
+
+    def _add_filter(self, key: tuple, signal_filter: dict | None) -> str | None:
+        # Shared filter for the effective arguments - a new filter starts with the last raw value
+        if not signal_filter:
+            return None
+        new_filter = SignalFilter(**signal_filter)
+        if new_filter.method == "raw":
+            return None
+        filters = self.sensors[key]['filters']
+        if new_filter.label not in filters:
+            raw = self.values.get(key)
+            filters[new_filter.label] = {"filter": new_filter, "value": new_filter.add(raw) if raw is not None else None,
+                                         "crossings": {"raw": 0, "filtered": 0}}
+        return new_filter.label
+
+    def _drop_subscriber(self, key: tuple, app):
+        sensor = self.sensors.get(key)
+        if sensor is None:
+            return
+        sensor['subscribers'].pop(app.name, None)
+        used = {label for _, _, _, label in sensor['subscribers'].values()}
+        for label in [label for label in sensor['filters'] if label not in used]:
+            del sensor['filters'][label]
+        if sensor['owner'] is not app:
+            return
+        try:
+            app.cancel_listen_state(sensor['handle'])
+        except Exception:
+            # Listener is removed by AppDaemon anyway when the app terminates
+            pass
+        sensor['owner'] = None
+        sensor['handle'] = None
+        if sensor['subscribers']:
+            next_app = next(iter(sensor['subscribers'].values()))[0]
+            self._listen(key, next_app)
+        else:
+            self.sensors.pop(key)
+            self.values.pop(key, None)
+
+    def on_sensor_change(self, entity, attribute, old, new, kwargs):
+        """
+        Single callback per sensor. Parses once and notifies instances whose thresholds were crossed.
+
+        Runs on the thread of the owning app: cache and filters are updated and subscribers are taken over while
+        holding the lock, thresholds and callbacks of instances are called after releasing it.
+        """
+        if new is None or new in INVALID_STATES:
+            return
+        key = (entity, attribute if attribute != "state" else None)
+        with self.lock:
+            sensor = self.sensors.get(key)
+            if sensor is None:
+                return
+            old = self._sample(key, sensor['parser'](new))
+            filters = list(sensor['filters'].items())
+            new_values = {None: self.values[key], **{label: entry['value'] for label, entry in filters}}
+            subscribers = list(sensor['subscribers'].values())
+            self.received += 1
+            self.fanout += len(subscribers)
+
+        crossings = self._count_crossings(filters, subscribers, old, new_values)
+        if crossings:
+            with self.lock:
+                for counts, kind in crossings:
+                    counts[kind] += 1
+
+        for _, callback, thresholds, label in subscribers:
+            if callback is None:
+                continue
+            old_value, value = old[label], new_values[label]
+            if value == old_value:
+                continue
+            if thresholds is not None and old_value is not None and not self.crossed(old_value, value, thresholds()):
+                continue
+            self.notified += 1
+            callback(entity, old_value, value)
+
+    def _sample(self, key: tuple, raw) -> dict:
+        # Cache raw value and feed all filters of sensor, lock is held. Returns previous values by label (None: raw)
+        sensor = self.sensors[key]
+        old = {None: self.values.get(key)}
+        self.values[key] = raw
+        for label, entry in sensor['filters'].items():
+            old[label] = entry['value']
+            entry['value'] = entry['filter'].add(raw)
+        for variance in self.variances.get(key, {}).values():
+            variance.add(raw)
+        return old
+
+    def _count_crossings(self, filters: list, subscribers: list, old: dict, new_values: dict) -> list:
+        # Compare how often raw and filtered values cross a threshold of the subscribers of each filter.
+        # Returns (crossing counts, "raw" or "filtered") to be incremented
+        crossings = []
+        for label, entry in filters:
+            thresholds = [threshold for _, _, subscriber_thresholds, subscriber_label in subscribers
+                          if subscriber_label == label and subscriber_thresholds is not None
+                          for threshold in subscriber_thresholds()]
+            if old[None] is not None and self.crossed(old[None], new_values[None], thresholds):
+                crossings.append((entry['crossings'], "raw"))
+            if old[label] is not None and self.crossed(old[label], new_values[label], thresholds):
+                crossings.append((entry['crossings'], "filtered"))
+        return crossings
+
+    @staticmethod
+    def crossed(old, new, thresholds: Iterable[float]) -> bool:
+        """Check if the value changed its side (below, equal, above) for any threshold."""
+        for threshold in thresholds:
+            if threshold is None:
+                continue
+            if (old > threshold) != (new > threshold) or (old < threshold) != (new < threshold):
+                return True
+        return False
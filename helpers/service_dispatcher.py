@@ -0,0 +1,91 @@
+from threading import RLock
+from typing import Callable
+
+SERVICE_TURN_ON = "turn_on"
+SERVICE_TURN_OFF = "turn_off"
+
+
+class ServiceDispatcher:
+    """
+    Singleton class listening once to input_boolean call_service events for all blinds and shutter instances.
+    Events are routed by an index from entity_id to the owning instance, so instances only get calls
+    for their own internal entities.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ServiceDispatcher, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'routes'):
+            # entity_id -> (app, callback)
+            self.routes = {}
+            self.owner = None
+            self.handle = None
+            self.lock = RLock()
+            self.received = 0
+            self.dispatched = 0
+
+    def register(self, app, entity_ids: list, callback: Callable[[str, str], None]):
+        """
+        Route service calls of entities to an instance.
+
+        Args:
+            app: The AppDaemon app owning the entities
+            entity_ids: input_boolean entity ids including the input_boolean. prefix
+            callback: Called with (entity_id, service) for turn_on/turn_off calls
+        """
+        with self.lock:
+            for entity_id in entity_ids:
+                self.routes[entity_id] = (app, callback)
+            if self.owner is None:
+                self._listen(app)
+
+    def unregister(self, app):
+        """
+        Remove all routes of an instance. When it owned the listener, another instance takes over.
+
+        Args:
+            app: The AppDaemon app to remove
+        """
+        with self.lock:
+            self.routes = {entity_id: route for entity_id, route in self.routes.items() if route[0] is not app}
+            if self.owner is not app:
+                return
+            try:
+                app.cancel_listen_event(self.handle)
+            except Exception:
+                # Listener is removed by AppDaemon anyway when the app terminates
+                pass
+            self.owner = None
+            self.handle = None
+            if self.routes:
+                next_app, _ = next(iter(self.routes.values()))
+                self._listen(next_app)
+
+    def _listen(self, app):
+        self.owner = app
+        # Filter on domain is done by AppDaemon - other domains never reach this callback
+        self.handle = app.listen_event(self.on_call_service, "call_service", domain="input_boolean")
+
+    def on_call_service(self, event_name, data, kwargs):
+        """Single call_service callback. Dispatches to owning instances."""
+        self.received += 1
+        if data.get('service') not in (SERVICE_TURN_ON, SERVICE_TURN_OFF):
+            return
+        # Service data could have a list of entity_ids or just one single string (either called by service or manually switching)
+        entity_ids = data.get('service_data', {}).get('entity_id')
+        if isinstance(entity_ids, str):
+            entity_ids = [entity_ids]
+        elif not isinstance(entity_ids, list):
+            return
+
+        for entity_id in entity_ids:
+            route = self.routes.get(entity_id)
+            if route is None:
+                continue
+            self.dispatched += 1
+            route[1](entity_id, data['service'])
@@ -0,0 +1,136 @@
+import math
+from array import array
+from bisect import bisect_left, insort
+
+FILTER_METHODS = ("raw", "ema", "median", "percentile")
+
+
+class SignalFilter:
+    """
+    Streaming filter for noisy sensor values (e.g. brightness on days with broken clouds).
+
+    The last samples are kept in an array backed ring buffer of fixed size. Methods:
+    - raw: no filtering
+    - ema: exponential moving average
+    - median / percentile: percentile of the samples in the window
+
+    ema is O(1) per sample. median and percentile are O(window) per sample: the ring buffer replaces the oldest
+    sample, its position in the sorted copy of the window is found by bisection, but removing and inserting
+    shifts the list. Windows are a few samples, so this stays cheaper than sorting the window on every sample.
+    """
+
+    def __init__(self, method: str = "raw", window: int = 5, percentile: float = 50, alpha: float = 0.3):
+        """
+        Args:
+            method: One of FILTER_METHODS
+            window: Number of samples for median and percentile
+            percentile: Percentile (0...100) for method percentile
+            alpha: Weight of a new sample for method ema
+        """
+        if method not in FILTER_METHODS:
+            raise ValueError(f"Unknown filter method: {method}")
+        self.method = method
+        self.window = max(1, int(window))
+        self.percentile = 50 if method == "median" else percentile
+        self.alpha = alpha
+        self.buffer = array('d', [0.0] * self.window)
+        self.sorted = []
+        self.index = 0
+        self.count = 0
+        self.ema = None
+
+    @property
+    def label(self) -> str:
+        """Effective arguments, e.g. median(5). Filters with equal labels return equal values for equal samples."""
+        if self.method == "ema":
+            return f"ema({self.alpha})"
+        if self.method == "median":
+            return f"median({self.window})"
+        if self.method == "percentile":
+            return f"percentile({self.percentile}, {self.window})"
+        return "raw"
+
+    def add(self, value: float) -> float:
+        """
+        Add a sample.
+
+        Args:
+            value: Raw sensor value
+
+        Returns:
+            Filtered value
+        """
+        if self.method == "raw":
+            return value
+        if self.method == "ema":
+            self.ema = value if self.ema is None else self.ema + self.alpha * (value - self.ema)
+            return self.ema
+
+        if self.count == self.window:
+            # Replace oldest sample
+            oldest = self.buffer[self.index]
+            del self.sorted[bisect_left(self.sorted, oldest)]
+        else:
+            self.count += 1
+        self.buffer[self.index] = value
+        insort(self.sorted, value)
+        self.index = (self.index + 1) % self.window
+        # Nearest rank percentile
+        rank = max(1, math.ceil(self.percentile / 100 * self.count))
+        return self.sorted[rank - 1]
+
+
+class RunningVariance:
+    """
+    Variance of the last samples of a sensor, updated online (Welford's algorithm over a sliding window).
+
+    When the window is full, the oldest sample is replaced by the new one and mean and sum of squared
+    deviations are updated from both - constant work per sample and no sum over the window.
+    """
+
+    def __init__(self, window: int = 20):
+        """
+        Args:
+            window: Number of samples
+        """
+        self.window = max(2, int(window))
+        self.buffer = array('d', [0.0] * self.window)
+        self.index = 0
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared deviations from mean
+        self.m2 = 0.0
+
+    def add(self, value: float):
+        """
+        Add a sample.
+
+        Args:
+            value: Raw sensor value
+        """
+        if self.count == self.window:
+            oldest = self.buffer[self.index]
+            delta = value - oldest
+            mean = self.mean + delta / self.count
+            self.m2 = max(0.0, self.m2 + delta * (value - mean + oldest - self.mean))
+            self.mean = mean
+        else:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        self.buffer[self.index] = value
+        self.index = (self.index + 1) % self.window
+
+    def variance(self) -> float | None:
+        """Sample variance of the window or None with less than two samples."""
+        if self.count < 2:
+            return None
+        return self.m2 / (self.count - 1)
+
+    def coefficient_of_variation(self) -> float | None:
+        """Standard deviation relative to mean or None when not known (too few samples, mean not positive)."""
+        variance = self.variance()
+        if variance is None or self.mean <= 0:
+            return None
+        return math.sqrt(variance) / self.mean
@@ -0,0 +1,102 @@
+import json
+import sqlite3
+from threading import RLock
+
+from helpers.state_writer import StateWriter
+
+
+class StateStore:
+    """
+    Singleton SQLite store for the states of all blinds and shutter instances.
+
+    One database in WAL mode with one row per unique_id replaces a JSON file per instance. Saves only mark the
+    instance as dirty, all dirty instances are written in one transaction by the StateWriter thread shortly
+    after the first save - so one run of all instances at :00/:30 leads to one commit.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(StateStore, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'dirty'):
+            # unique_id -> latest state data not yet committed
+            self.dirty = {}
+            self.connection = None
+            self.path = None
+            self.writer = StateWriter()
+            # lock guards dirty, database lock the connection - saves never wait for database I/O
+            self.lock = RLock()
+            self.database_lock = RLock()
+            self.stats = {"saves": 0, "commits": 0, "rows": 0}
+
+    def open(self, path: str):
+        """
+        Open database (only first call has an effect).
+
+        Args:
+            path: Path of SQLite database file
+        """
+        with self.database_lock:
+            if self.connection is not None:
+                return
+            # Connection is shared between threads - access is serialized by database lock
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode a commit is durable after checkpoint - enough for states which are only restored within an hour
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS states (unique_id TEXT PRIMARY KEY, saved_at TEXT NOT NULL, data TEXT NOT NULL)"
+            )
+            self.connection.commit()
+            self.path = path
+
+    def load(self, unique_id: str) -> dict | None:
+        """
+        Read state of an instance.
+
+        Args:
+            unique_id: unique_id of instance
+
+        Returns:
+            State data as saved or None when nothing was saved
+        """
+        with self.lock:
+            if unique_id in self.dirty:
+                return self.dirty[unique_id]
+        with self.database_lock:
+            row = self.connection.execute("SELECT data FROM states WHERE unique_id = ?", (unique_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, unique_id: str, data: dict):
+        """
+        Save state of an instance. Written with the next commit, a newer save of same instance replaces it.
+
+        Args:
+            unique_id: unique_id of instance
+            data: JSON serializable state data including "timestamp"
+        """
+        with self.lock:
+            self.dirty[unique_id] = data
+            self.stats['saves'] += 1
+        # One pending commit for all instances
+        self.writer.submit(StateStore, self.flush)
+
+    def flush(self, data=None):
+        """Commit all dirty instances in one transaction. Runs on the StateWriter thread."""
+        with self.lock:
+            dirty = self.dirty
+            self.dirty = {}
+        if not dirty:
+            return
+        rows = [(unique_id, state['timestamp'], json.dumps(state)) for unique_id, state in dirty.items()]
+        with self.database_lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO states (unique_id, saved_at, data) VALUES (?, ?, ?)", rows
+                )
+        self.stats['commits'] += 1
+        self.stats['rows'] += len(rows)
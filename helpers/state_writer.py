@@ -0,0 +1,117 @@
+import time
+from threading import Condition, Thread
+from typing import Callable
+
+from helpers.metrics import LatencyHistogram
+
+# Seconds to collect further saves after the first one, so one round of evaluations is written in one batch
+BATCH_WINDOW = 1
+# Max number of pending writes (one per instance) before submit waits for the writer
+MAX_PENDING = 1000
+
+
+class StateWriter:
+    """
+    Singleton write-behind thread for persisting states of all blinds and shutter instances.
+
+    Instances submit the latest state per key (e.g. unique_id) and return immediately. A newer submit of
+    the same key replaces the pending one, so the queue holds at most one snapshot per instance. The
+    background thread writes all pending snapshots in batches - file or database I/O never runs on the
+    AppDaemon worker threads.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(StateWriter, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'pending'):
+            # key -> (write, data)
+            self.pending = {}
+            self.writing = False
+            self.flushing = False
+            self.condition = Condition()
+            self.thread = None
+            self.last_error = None
+            self.flush_latency = LatencyHistogram()
+            self.counts = {"submitted": 0, "replaced": 0, "writes": 0, "batches": 0, "errors": 0, "full": 0}
+
+    def submit(self, key, write: Callable, data=None):
+        """
+        Hand over a write to the background thread.
+
+        Args:
+            key: Key of the snapshot - a pending write with same key is replaced
+            write: Called with data on the writer thread
+            data: Snapshot to write (must not be modified after submit)
+        """
+        with self.condition:
+            if key not in self.pending and len(self.pending) >= MAX_PENDING:
+                # Writer can't keep up - wait instead of growing without limit
+                self.counts['full'] += 1
+                self.condition.wait_for(lambda: len(self.pending) < MAX_PENDING, timeout=10)
+            if key in self.pending:
+                self.counts['replaced'] += 1
+            self.pending[key] = (write, data)
+            self.counts['submitted'] += 1
+            if self.thread is None:
+                self.thread = Thread(target=self._run, name="state_writer", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def flush(self, timeout: float = 10) -> bool:
+        """
+        Wait until all pending writes are done (e.g. on shutdown).
+
+        Args:
+            timeout: Max seconds to wait
+
+        Returns:
+            True when everything was written in time
+        """
+        with self.condition:
+            # Wake writer without waiting for the batch window
+            self.flushing = True
+            self.condition.notify_all()
+            try:
+                return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout=timeout)
+            finally:
+                self.flushing = False
+
+    def depth(self) -> int:
+        """Number of pending writes."""
+        return len(self.pending)
+
+    def stats(self) -> dict:
+        """Counters, queue depth and latency of batch writes."""
+        return {**self.counts, "depth": len(self.pending), "flush_latency": self.flush_latency.as_dict(),
+                "last_error": self.last_error}
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                # Collect further writes of this round - a flush wakes up early
+                self.condition.wait_for(lambda: self.flushing, timeout=BATCH_WINDOW)
+                batch = list(self.pending.values())
+                self.pending.clear()
+                self.writing = True
+                self.condition.notify_all()
+
+            started = time.monotonic()
+            for write, data in batch:
+                try:
+                    write(data)
+                    self.counts['writes'] += 1
+                except Exception as e:
+                    self.counts['errors'] += 1
+                    self.last_error = repr(e)
+            self.flush_latency.observe(time.monotonic() - started)
+            self.counts['batches'] += 1
+
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
@@ -0,0 +1,171 @@
+from datetime import datetime
+from threading import RLock
+from typing import Callable, NamedTuple
+from helpers.sun_index import FacadeSunIndex, sun_deviation
+
+UNAVAILABLE = 'unavailable'
+UNKNOWN = 'unknown'
+
+
+class SunSnapshot(NamedTuple):
+    """Immutable view of the sun position relative to one facade."""
+    azimuth: float
+    elevation: float
+    next_dusk: datetime
+    deviation: float
+    in_sun: bool
+
+
+class SunHub:
+    """
+    Singleton class sharing one sun.sun subscription between all blinds and shutter instances.
+    Every sun update is parsed once. Instances pull an immutable SunSnapshot for their facade
+    (calculated once per distinct facade and update) and only instances whose facade entered or
+    left the sun are woken via their callback.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SunHub, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'subscribers'):
+            # app name -> (app, facade key, callback)
+            self.subscribers = {}
+            self.index = FacadeSunIndex()
+            self.owner = None
+            self.handle = None
+            self.sun_state = None
+            self.snapshots = {}
+            self.updates = 0
+            self.woken = 0
+            self.lock = RLock()
+
+    @staticmethod
+    def facade_key(facade: dict) -> tuple:
+        """
+        Build the hashable key describing a facade's sun window.
+
+        Args:
+            facade: The facade config block of an instance
+
+        Returns:
+            Tuple of facade angle, entry/exit offset and elevation band
+        """
+        return (
+            facade['facade_angle'],
+            facade['facade_offset_entry'],
+            facade['facade_offset_exit'],
+            facade['min_elevation'],
+            facade['max_elevation'],
+        )
+
+    def register(self, app, facade: dict, callback: Callable[[SunSnapshot], None]) -> SunSnapshot | None:
+        """
+        Register an instance for sun updates.
+
+        Args:
+            app: The AppDaemon app registering (also used to listen when no listener exists yet)
+            facade: The facade config block of the instance
+            callback: Called with a SunSnapshot when the facade entered or left the sun
+
+        Returns:
+            SunSnapshot for the current sun position or None when sun.sun is not available
+        """
+        key = self.facade_key(facade)
+        with self.lock:
+            self.subscribers[app.name] = (app, key, callback)
+            self.index.add(key)
+            if self.owner is None:
+                self._listen(app)
+            if self.sun_state is None:
+                self._parse(app.get_state("sun.sun", attribute="all"))
+            if self.sun_state is None:
+                return None
+            # Take over in sun state of a newly added facade without waking anybody
+            self.index.update(self.sun_state[0], self.sun_state[1])
+            self.snapshots.pop(key, None)
+            return self.snapshot(key)
+
+    def unregister(self, app):
+        """
+        Remove an instance. When it owned the sun.sun listener, another instance takes over.
+
+        Args:
+            app: The AppDaemon app to remove
+        """
+        with self.lock:
+            subscriber = self.subscribers.pop(app.name, None)
+            if subscriber is not None and not any(key == subscriber[1] for _, key, _ in self.subscribers.values()):
+                self.index.remove(subscriber[1])
+            if self.owner is not app:
+                return
+            try:
+                app.cancel_listen_state(self.handle)
+            except Exception:
+                # Listener is removed by AppDaemon anyway when the app terminates
+                pass
+            self.owner = None
+            self.handle = None
+            if self.subscribers:
+                next_app, _, _ = next(iter(self.subscribers.values()))
+                self._listen(next_app)
+            else:
+                self.sun_state = None
+                self.snapshots = {}
+
+    def snapshot(self, key: tuple) -> SunSnapshot | None:
+        """
+        Actual sun position relative to a facade. Calculated once per facade and sun update.
+
+        Args:
+            key: Facade key built by facade_key()
+
+        Returns:
+            SunSnapshot or None when sun.sun is not available
+        """
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            with self.lock:
+                if self.sun_state is None:
+                    return None
+                azimuth, elevation, next_dusk = self.sun_state
+                deviation = sun_deviation(azimuth, key[0])
+                snapshot = SunSnapshot(azimuth, elevation, next_dusk, deviation, self.index.is_in_sun(key))
+                self.snapshots[key] = snapshot
+        return snapshot
+
+    def _listen(self, app):
+        self.owner = app
+        self.handle = app.listen_state(self.on_sun_change, 'sun.sun', attribute="all")
+
+    def on_sun_change(self, entity, attribute, old, new, kwargs):
+        """Single sun.sun callback. Parses once and wakes instances whose facade entered or left the sun."""
+        with self.lock:
+            if not self._parse(new):
+                return
+            self.updates += 1
+            entered, left = self.index.update(self.sun_state[0], self.sun_state[1])
+            self.snapshots = {}
+            changed = set(entered) | set(left)
+            if not changed:
+                return
+            woken = [(callback, self.snapshot(key)) for _, key, callback in self.subscribers.values() if key in changed]
+
+        self.woken += len(woken)
+        for callback, snapshot in woken:
+            callback(snapshot)
+
+    def _parse(self, new) -> bool:
+        if new in (None, UNKNOWN, UNAVAILABLE):
+            return False
+        attributes = new['attributes']
+        self.sun_state = (
+            attributes['azimuth'],
+            attributes['elevation'],
+            datetime.fromisoformat(attributes['next_dusk']),
+        )
+        return True
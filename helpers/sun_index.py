@@ -0,0 +1,131 @@
+SLOTS = 360
+
+
+def sun_deviation(azimuth: float, facade_angle: float) -> float:
+    """Normalize the difference between sun azimuth and facade angle to -180...+180."""
+    deviation = round((azimuth - facade_angle) % 360, 2)
+    if deviation > 180:
+        deviation = round(deviation - 360, 2)
+    return deviation
+
+
+class FacadeSunIndex:
+    """
+    Precomputed index which facades are in sun for a sun position.
+
+    The azimuth circle is split into 360 one-degree slots. For every slot there is a bitmap of facades
+    whose azimuth window covers the whole slot and a bitmap of facades whose window border lies in the slot.
+    A lookup costs one slot access plus an exact check of the border facades and the elevation band of
+    every candidate - O(1 + k) for k candidates instead of testing every facade.
+    """
+
+    def __init__(self):
+        # facade key -> bit id
+        self.ids = {}
+        # bit id -> facade key
+        self.facades = []
+        self.full = [0] * SLOTS
+        self.partial = [0] * SLOTS
+        self.in_sun_mask = 0
+
+    def add(self, facade_key: tuple) -> int:
+        """
+        Add a facade to the index.
+
+        Args:
+            facade_key: Tuple of facade angle, entry/exit offset and min/max elevation
+
+        Returns:
+            Bit id of facade
+        """
+        if facade_key in self.ids:
+            return self.ids[facade_key]
+        facade_id = len(self.facades)
+        self.ids[facade_key] = facade_id
+        self.facades.append(facade_key)
+
+        facade_angle, sun_entry, sun_exit, _, _ = facade_key
+        bit = 1 << facade_id
+        for slot in range(SLOTS):
+            # Deviations of this slot are in [start, start + 1] (upper border due to rounding)
+            start = sun_deviation(slot, facade_angle)
+            if start + 1 > 180:
+                # Deviation wraps from +180 to -180 inside this slot - always check exactly
+                self.partial[slot] |= bit
+            elif sun_entry <= start and start + 1 <= sun_exit:
+                self.full[slot] |= bit
+            elif start <= sun_exit and sun_entry <= start + 1:
+                self.partial[slot] |= bit
+        return facade_id
+
+    def remove(self, facade_key: tuple):
+        """Remove a facade. Bit ids of other facades may change, so the index is rebuilt."""
+        if facade_key not in self.ids:
+            return
+        keys = [key for key in self.facades if key != facade_key]
+        in_sun_keys = [key for key in keys if self.is_in_sun(key)]
+        self.__init__()
+        for key in keys:
+            self.add(key)
+        for key in in_sun_keys:
+            self.in_sun_mask |= 1 << self.ids[key]
+
+    def in_sun(self, azimuth: float, elevation: float) -> int:
+        """
+        Determine facades in sun.
+
+        Args:
+            azimuth: Sun azimuth in degree
+            elevation: Sun elevation in degree
+
+        Returns:
+            Bitmap of facade ids in sun
+        """
+        slot = int(azimuth) % SLOTS
+        candidates = self.full[slot]
+        partial = self.partial[slot]
+        while partial:
+            bit = partial & -partial
+            partial ^= bit
+            facade_angle, sun_entry, sun_exit, _, _ = self.facades[bit.bit_length() - 1]
+            if sun_entry <= sun_deviation(azimuth, facade_angle) <= sun_exit:
+                candidates |= bit
+
+        result = 0
+        while candidates:
+            bit = candidates & -candidates
+            candidates ^= bit
+            _, _, _, min_elevation, max_elevation = self.facades[bit.bit_length() - 1]
+            if min_elevation <= elevation <= max_elevation:
+                result |= bit
+        return result
+
+    def update(self, azimuth: float, elevation: float) -> tuple[list, list]:
+        """
+        Determine facades in sun and the changes since the last update.
+
+        Args:
+            azimuth: Sun azimuth in degree
+            elevation: Sun elevation in degree
+
+        Returns:
+            Tuple of facade keys which entered the sun and facade keys which left the sun
+        """
+        mask = self.in_sun(azimuth, elevation)
+        changed = mask ^ self.in_sun_mask
+        self.in_sun_mask = mask
+        entered = []
+        left = []
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            if mask & bit:
+                entered.append(self.facades[bit.bit_length() - 1])
+            else:
+                left.append(self.facades[bit.bit_length() - 1])
+        return entered, left
+
+    def is_in_sun(self, facade_key: tuple) -> bool:
+        """In sun state of facade from last update."""
+        facade_id = self.ids.get(facade_key)
+        return facade_id is not None and bool(self.in_sun_mask >> facade_id & 1)
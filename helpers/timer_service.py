@@ -0,0 +1,141 @@
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from threading import RLock
+from typing import Callable
+
+# Scheduler entry fires this late after the earliest deadline, so timers expiring within this window are fired together
+BATCH_WINDOW = timedelta(seconds=1)
+
+
+class TimerService:
+    """
+    Singleton heap based timer service for the delay timers of all blinds and shutter instances.
+
+    Arming and re-arming pushes onto a heap, cancel only drops the entry from a dict (stale heap entries
+    are skipped when they come up). Only the earliest deadline is scheduled in AppDaemon, so flickering
+    timers don't create and cancel scheduler entries. Expirations are fired in batches per callback.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TimerService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not hasattr(self, 'timers'):
+            # key -> (sequence, deadline, app, callback)
+            self.timers = {}
+            self.heap = []
+            self.sequence = itertools.count()
+            self.owner = None
+            self.handle = None
+            self.scheduled_at = None
+            self.lock = RLock()
+            self.stats = {"arms": 0, "cancels": 0, "fires": 0, "batches": 0, "stale": 0, "reschedules": 0}
+
+    def arm(self, app, key: str, deadline: datetime, callback: Callable[[list], None]):
+        """
+        Arm or re-arm a timer.
+
+        Args:
+            app: The AppDaemon app owning the timer (also used for scheduling when no other app does)
+            key: Unique key of timer. Re-arming the same key replaces the previous deadline
+            deadline: Time when timer expires
+            callback: Called with the list of expired keys
+        """
+        with self.lock:
+            sequence = next(self.sequence)
+            self.timers[key] = (sequence, deadline, app, callback)
+            heapq.heappush(self.heap, (deadline, sequence, key))
+            self.stats['arms'] += 1
+            if self.owner is None:
+                self.owner = app
+            self._schedule()
+
+    def cancel(self, key: str):
+        """Cancel a timer. Unknown keys are ignored."""
+        with self.lock:
+            if self.timers.pop(key, None) is not None:
+                self.stats['cancels'] += 1
+            # Drop stale entries when the heap mostly consists of them
+            if len(self.heap) > 2 * len(self.timers) + 16:
+                self.heap = [(deadline, sequence, key) for key, (sequence, deadline, _, _) in self.timers.items()]
+                heapq.heapify(self.heap)
+
+    def deadline(self, key: str) -> datetime | None:
+        """Deadline of an armed timer or None."""
+        timer = self.timers.get(key)
+        return timer[1] if timer else None
+
+    def unregister(self, app):
+        """
+        Cancel all timers of an instance. When it owned the scheduler entry, another instance takes over.
+
+        Args:
+            app: The AppDaemon app to remove
+        """
+        with self.lock:
+            for key in [key for key, timer in self.timers.items() if timer[2] is app]:
+                self.cancel(key)
+            if self.owner is not app:
+                return
+            self._cancel_scheduled()
+            self.owner = None
+            if self.timers:
+                self.owner = next(iter(self.timers.values()))[2]
+                self._schedule()
+
+    def _head(self) -> datetime | None:
+        # Skip stale entries of cancelled or re-armed timers
+        while self.heap:
+            deadline, sequence, key = self.heap[0]
+            timer = self.timers.get(key)
+            if timer is not None and timer[0] == sequence:
+                return deadline
+            heapq.heappop(self.heap)
+            self.stats['stale'] += 1
+        return None
+
+    def _schedule(self):
+        head = self._head()
+        if head is None or (self.scheduled_at is not None and self.scheduled_at <= head):
+            # Nothing to do or scheduler entry already early enough
+            return
+        self._cancel_scheduled()
+        self.scheduled_at = head
+        self.handle = self.owner.run_in(self.on_timer, max(0, (head + BATCH_WINDOW - datetime.now()).total_seconds()))
+        self.stats['reschedules'] += 1
+
+    def _cancel_scheduled(self):
+        if self.handle is not None:
+            try:
+                self.owner.cancel_timer(self.handle)
+            except Exception:
+                # Timer already fired or removed together with the app
+                pass
+        self.handle = None
+        self.scheduled_at = None
+
+    def on_timer(self, kwargs):
+        """Scheduler callback. Fires all due timers in batches per callback."""
+        batches = {}
+        with self.lock:
+            self.handle = None
+            self.scheduled_at = None
+            limit = datetime.now()
+            while True:
+                head = self._head()
+                if head is None or head > limit:
+                    break
+                _, _, key = heapq.heappop(self.heap)
+                _, _, _, callback = self.timers.pop(key)
+                batches.setdefault(callback, []).append(key)
+                self.stats['fires'] += 1
+            self._schedule()
+
+        for callback, keys in batches.items():
+            self.stats['batches'] += 1
+            callback(keys)
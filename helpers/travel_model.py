@@ -0,0 +1,80 @@
+# Weight of a new observation in the moving average of travel rates
+ALPHA = 0.3
+# Moves shorter than this (percent) are not used for learning - start delay of the motor dominates
+MIN_DISTANCE = 5
+DIRECTIONS = ("up", "down", "tilt")
+
+
+class TravelModel:
+    """
+    Learned travel times of one cover.
+
+    Seconds per percent for moving up, moving down and tilting are learned from the time between a command
+    and the report of its final position (exponential moving average). The model is saved with the states
+    of the instance and predicts arrival times of new commands.
+    """
+
+    def __init__(self):
+        # direction -> seconds per percent (None as long as nothing was observed)
+        self.rates = dict.fromkeys(DIRECTIONS)
+        self.samples = dict.fromkeys(DIRECTIONS, 0)
+
+    def observe(self, direction: str, distance: float, seconds: float):
+        """
+        Learn from a finished move.
+
+        Args:
+            direction: "up", "down" or "tilt"
+            distance: Travelled distance in percent
+            seconds: Time from command to report of final position
+        """
+        if distance < MIN_DISTANCE or seconds <= 0:
+            return
+        rate = seconds / distance
+        current = self.rates[direction]
+        self.rates[direction] = rate if current is None else current + ALPHA * (rate - current)
+        self.samples[direction] += 1
+
+    def predict(self, height_from=None, height_to=None, angle_from=None, angle_to=None) -> float | None:
+        """
+        Predict travel time of a command.
+
+        Args:
+            height_from: Height before command (None when height is not changed)
+            height_to: Commanded height
+            angle_from: Tilt before command (None when tilt is not changed)
+            angle_to: Commanded tilt
+
+        Returns:
+            Seconds till the final position is reported or None when a needed rate was not learned yet
+        """
+        seconds = 0
+        if height_from is not None and height_to is not None and height_from != height_to:
+            rate = self.rates["up" if height_to > height_from else "down"]
+            if rate is None:
+                return None
+            seconds += rate * abs(height_to - height_from)
+        if angle_from is not None and angle_to is not None and angle_from != angle_to:
+            rate = self.rates["tilt"]
+            if rate is None:
+                return None
+            seconds += rate * abs(angle_to - angle_from)
+        return seconds
+
+    def as_dict(self) -> dict:
+        """Learned rates (seconds per percent) and number of observations - saved with states."""
+        return {direction: {"rate": round(self.rates[direction], 4) if self.rates[direction] is not None else None,
+                            "samples": self.samples[direction]}
+                for direction in DIRECTIONS}
+
+    def restore(self, data: dict | None):
+        """
+        Restore a model saved by as_dict.
+
+        Args:
+            data: Saved model. Unknown or missing entries are ignored
+        """
+        for direction, entry in (data or {}).items():
+            if direction in self.rates and isinstance(entry, dict):
+                self.rates[direction] = entry.get("rate")
+                self.samples[direction] = entry.get("samples", 0)
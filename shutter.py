@@ -3,11 +3,24 @@ import os.path
 import math
 import time
 import json
+import zlib
 from datetime import datetime, timedelta
 from time import sleep
 # from decimal import Decimal, ROUND_HALF_EVEN
 from appdaemon.plugins.hass.hassapi import Hass
 from helpers.entity_collector import EntityCollector
+from helpers.sun_hub import SunHub
+from helpers.sensor_hub import SensorHub, alarm_value
+from helpers.signal_filter import FILTER_METHODS
+from helpers.service_dispatcher import ServiceDispatcher
+from helpers.timer_service import TimerService
+from helpers.mailbox import Mailbox
+from helpers.metrics import LatencyHistogram, EVALUATIONS
+from helpers.state_store import StateStore
+from helpers.state_writer import StateWriter
+from helpers.publisher import Publisher
+from helpers.fleet_status import FleetStatus
+from helpers.travel_model import TravelModel
 
 # Constants
 STATE_ON = 'on'
@@ -16,6 +29,25 @@ WINDOW_OPEN = 'on'
 WINDOW_CLOSED = 'off'
 UNAVAILABLE = 'unavailable'
 UNKNOWN = 'unknown'
+INVALID_STATES = frozenset({None, UNKNOWN, UNAVAILABLE})
+# Cover states without final position
+COVER_NOT_SETTLED = frozenset({"opening", "closing", UNKNOWN, UNAVAILABLE})
+
+# Upper bound of tick interval - state is never older than this
+TICK_MAX_INTERVAL = 600
+# Degrees around facade entry/exit and min/max elevation where the fast tick is used
+TICK_BOUNDARY_MARGIN = 5
+# Command without final position reported in this time is given up (response missing)
+COMMAND_TIMEOUT = timedelta(seconds=120)
+# With a learned travel time the final position is expected within travel time * factor + margin (seconds)
+TRAVEL_TIMEOUT_FACTOR = 2
+TRAVEL_TIMEOUT_MARGIN = 15
+# Feature bits of cover entities (attribute supported_features)
+COVER_SUPPORT_SET_POSITION = 4
+COVER_SUPPORT_STOP = 8
+COVER_SUPPORT_SET_TILT_POSITION = 128
+# Delays scaled by volatility of brightness when adaptive delays are active
+ADAPTIVE_DELAYS = ("neutral_to_shadow_delay", "shadow_to_neutral_delay")
 
 class Shutter(Hass):
     """Represents a single shutter with its configuration and state."""
@@ -50,6 +82,7 @@ class Shutter(Hass):
         "shadow_active": True,
         "shadow": {
             "shadow_brightness_threshold": 50000,
+            "shadow_brightness_hysteresis": 0,
             "total_height": 2000,
             "light_strip": 500
         },
@@ -70,8 +103,39 @@ class Shutter(Hass):
             "ventilation_height": 0,
         },
         "lockout_protection_active": False,
+        "weather_alarm_active": False,
+        "weather_alarm": {
+            "wind_speed_threshold": 50,
+            "wind_speed_hysteresis": 10,
+            "rain_threshold": 1,
+            "rain_hysteresis": 0,
+            "weather_alarm_height": 100,
+            "weather_alarm_hold_min": 10
+        },
+        "brightness_filter": {
+            "method": "raw",
+            "window": 5,
+            "percentile": 50,
+            "alpha": 0.3
+        },
+        "adaptive_delays_active": False,
+        "adaptive_delays": {
+            "volatility_window": 20,
+            "volatility_reference": 0.5,
+            "neutral_to_shadow_delay_min": 60,
+            "neutral_to_shadow_delay_max": 600,
+            "shadow_to_neutral_delay_min": 300,
+            "shadow_to_neutral_delay_max": 1800
+        },
         "shutter_locked_external_for_min": 30,
+        "trigger_debounce_ms": 200,
+        "tick_interval_fast": 30,
+        "tick_interval_slow": 300,
+        "phase_group": None,
+        "status_entity": None,
+        "preemption_min_travel": 10,
         "save_states": False,
+        "state_backend": "file",
         "DEBUG": False
     }
 
@@ -83,32 +147,91 @@ class Shutter(Hass):
         # Merge default config with provided args (apps.yaml)
         self.params = self.deep_merge_config(self.DEFAULT_CONFIG, self.args)
 
+        # Set when initialization is finished
+        self.ready = False
+
+        # One clock reading per evaluation - see process_messages
+        self.now = datetime.now()
+        self.sun = None
+
+        # Shared subscriptions for all instances (released again in terminate)
+        self.sun_hub = SunHub()
+        self.sensor_hub = SensorHub()
+        self.service_dispatcher = ServiceDispatcher()
+        self.timer_service = TimerService()
+        self.state_store = StateStore()
+        self.state_writer = StateWriter()
+        self.fleet_status = FleetStatus()
+
+        if self.params['status_entity']:
+            # Shared services are published with the aggregated status
+            self.fleet_status.add_stats_source("evaluations", EVALUATIONS.as_dict)
+            self.fleet_status.add_stats_source("state_writer", self.state_writer.stats)
+            self.fleet_status.add_stats_source("sensors", self.sensor_hub.stats)
+            self.fleet_status.add_stats_source("timers", lambda timer_service=self.timer_service: dict(timer_service.stats))
+
+        # All inputs are processed through the mailbox on the thread of this app - bursts within debounce window lead to one run of main
+        self.mailbox = Mailbox(self, self.process_messages, debounce=self.params['trigger_debounce_ms'] / 1000)
+
+        # Latency from trigger (event posted to mailbox) to command sent to cover
+        self.trigger_posted_at = None
+        self.trigger_urgent = False
+        self.trigger_alarm = False
+        self.latency = {"trigger": LatencyHistogram(), "urgent": LatencyHistogram(), "alarm": LatencyHistogram(),
+                        "preemption_saved": LatencyHistogram()}
+
+        # Weather alarm: sensors above threshold and end of hold time after all cleared
+        self.weather_alarms = set()
+        self.weather_alarm_till = None
+
+        # Values derived from sensors and sun position - calculated once per run of main
+        self.evaluation = {}
+
         # Attribute if blinds is moving
         self.moving = False
+        # Position reported while moving
+        self.moving_height = None
+        # Context id of own command reported with opening/closing - final report of long moves carries a new one
+        self.moving_context = None
+        # Constraint which may interrupt a running move (see preempt_move)
+        self.preemption_reason = None
 
         # Defaulting debug state
         self.debug_active = False
 
-        # Add new variables for tracking automated changes
-        self.automated_change_counter = -1
-        self.max_automated_change_counter = 5  # Number of change position events after a automated change can happen (normally 2 - one event when height was arrived and one when also tilt was set)
+        # Commands sent by this logic: context id of service call -> sent time and if a final position was reported.
+        # State changes of cover with one of these context ids are caused by this logic
+        self.pending_commands = {}
+        self.last_command = None
+        # Writes of internal input_booleans - local mirror, no-op writes suppressed, coalesced per evaluation
+        self.publisher = Publisher(self)
         self.expected_height = None
 
         # Validate config
         self.validate_config()
+        self.init_feature_flags()
 
         # Initialize States beginning from Neutral
         self.shutter_state = self.STATE_NEUTRAL
         self.debug(f"Initialized state: {self.shutter_state}")
         self.shutter_locked_external_till = None
         self.timer = None
+        self.hysterese_reached = False
+
+        # Travel times of cover learned from own commands - restored with states
+        self.travel_model = TravelModel()
 
         # Check if we can load a previous stored state
-        self.load_state_from_file()
+        self.load_states()
 
         # Read actual values on initilization
         self.current_height = self.get_state(self.params['entities']['cover'], attribute='current_position')
-        self.expected_height = self.current_height
+        # Supported features of cover - commands which are not supported are skipped
+        self.cover_features = None
+        self.read_cover_features()
+        # Last commanded position restored from saved state - otherwise actual position
+        if self.expected_height is None:
+            self.expected_height = self.current_height
         self.debug(f"Current height: {self.current_height}")
         
         # Read configured sensors.
@@ -121,28 +244,39 @@ class Shutter(Hass):
             sleep(10)
             self.read_entity_values()
 
-        # Initialize sun attributes
-        sun_state = self.get_state("sun.sun", attribute="all")
-        self.on_sun_change(entity="manual_start", attribute={}, old="", new=sun_state, kwargs={})
+        # Initialize sun attributes - sun.sun is listened once by the shared hub. Only changes of in sun state wake this instance
+        self.sun_facade = self.sun_hub.facade_key(self.params['facade'])
+        self.set_sun_snapshot(self.sun_hub.register(self, self.params['facade'], self.on_sun_transition))
+
+        # Keep only sensors relevant for actual state subscribed
+        self.update_subscriptions()
 
         # Self generated Entities create and get actual state
         self.create_internal_entities()
 
         self.shutter_locked = self.get_state(self.name_shutter_locked)
         self.shutter_locked_external = self.get_state(self.name_shutter_locked_external)
-        # Reset external lock when initializing
-        if self.shutter_locked_external == STATE_ON:
-            self.set_state(entity_id=self.name_shutter_locked_external, state=STATE_OFF)
+        # Known states in HASS - writes of the same state are suppressed
+        self.publisher.observed(self.name_shutter_locked, self.shutter_locked)
+        self.publisher.observed(self.name_shutter_locked_external, self.shutter_locked_external)
+        # Reset external lock when initializing - except a restored lock which is still running
+        if self.shutter_locked_external_till is not None and self.shutter_locked_external_till > datetime.now():
+            if self.shutter_locked_external != STATE_ON:
+                self.publisher.set(self.name_shutter_locked_external, STATE_ON)
+                self.shutter_locked_external = STATE_ON
+            self.debug(f"Restored external lock till: {self.shutter_locked_external_till}")
+        else:
             self.shutter_locked_external_till = None
+            if self.shutter_locked_external == STATE_ON:
+                self.publisher.set(self.name_shutter_locked_external, STATE_OFF)
+                self.shutter_locked_external = STATE_OFF
 
         self.manipulation_active = self.get_state(self.name_manipulation_active)
-        self.position_change_ongoing_counter = 0
 
         # Initialize solar heating variables
         if self.params.get('solar_heating_available'):
             self.solar_heating_active = self.get_state(self.name_solar_heating_active)
-            self.hysterese_reached = False
-            self.set_state(self.name_solar_heating_status, STATE_OFF)
+            self.publisher.set(self.name_solar_heating_status, STATE_OFF)
         # Make variable generally available independent if solar heating is available or not
         self.solar_heating_status = STATE_OFF
 
@@ -155,39 +289,41 @@ class Shutter(Hass):
             self.listen_state(self.on_state_change, self.name_solar_heating_active)
 
 
-        # Listen to changes of sun position
-        self.listen_state(self.on_sun_change, 'sun.sun', attribute = "all")
-
-        # Listen to brightness sensor
-        self.listen_state(self.on_brightness_shadow_change, self.params['entities']['brightness_shadow'])
-        if self.params['entities'].get("brightness_dawn"):
-            self.listen_state(self.on_brightness_dawn_change, self.params['entities']['brightness_dawn'])
-
-        # Listen to Sunshine Brightness Threshold Sensor if configured
-        if self.params['shadow'].get('shadow_brightness_threshold_entity'):
-            self.listen_state(self.on_sunshine_brightness_threshold_change, self.params['shadow'].get('shadow_brightness_threshold_entity'))
-
         # Listen to window sensor when lockout protection is activated
         if self.params.get("lockout_protection_active") or self.params.get("ventilation_active"):
             self.listen_state(self.on_window_change, self.params['entities']['window_sensor'])
 
-        # Listen to current temperature
-        if self.params['entities'].get('climate'):
-            self.listen_state(self.on_temperature_change, self.params['entities']['climate'], attribute='current_temperature')
-        if self.params['entities'].get('temperature_sensor'):
-            self.listen_state(self.on_temperature_change, self.params['entities']['temperature_sensor'])
-
         # Listen to cover changes to detect manual changes
         self.listen_state(self.on_cover_change, self.params['entities']['cover'], attribute='all')
+        # After (re)connect to HASS the integration of the cover may have changed
+        self.listen_event(self.on_plugin_started, "plugin_started")
 
         # shedule main in 30 seconds
         self.schedule_main()
 
+        # Timer restored from file is signalled by TimerService from now on
+        if self.timer:
+            self.timer_service.arm(self, self.name, self.timer, self.on_timer_expired)
+
+        # From now on callbacks of shared hubs may trigger main
+        self.ready = True
+
         # Save state
-        self.save_states_to_file()
+        self.save_states()
         
         self.log(f"shutter initialized.")
 
+    def terminate(self):
+        """Release shared subscriptions when app is stopped or reloaded."""
+        self.sun_hub.unregister(self)
+        self.sensor_hub.unsubscribe(self)
+        self.service_dispatcher.unregister(self)
+        self.timer_service.unregister(self)
+        self.fleet_status.unregister(self)
+        # Write pending states before stopping
+        if not self.state_writer.flush():
+            self.error(f"Pending states not written on terminate: {self.state_writer.stats()}")
+
     def deep_merge_config(self, default: dict, override: dict) -> dict:
         """Recursively merge two dictionaries, preserving nested structures."""
         result = default.copy()
@@ -200,18 +336,144 @@ class Shutter(Hass):
                 
         return result
 
+    def init_feature_flags(self):
+        """Evaluate configuration switches once instead of on every run of main."""
+        self.ventilation_active = bool(self.params.get("ventilation_active"))
+        self.lockout_protection_active = bool(self.params.get("lockout_protection_active"))
+        self.prevent_move_up_after_dusk = bool(self.params['dawn'].get("dawn_prevent_move_up_after_dusk"))
+        self.has_dawn_sensor = bool(self.params['entities'].get("brightness_dawn"))
+        # Ventilation positions are only applied when configured as int
+        ventilation_height = self.params.get('ventilation', {}).get("ventilation_height")
+        self.ventilation_height = ventilation_height if type(ventilation_height) is int else None
+        self.weather_alarm_active = bool(self.params.get("weather_alarm_active"))
+
     def read_entity_values(self):
-        self.brightness_shadow = int(float(self.get_state(self.params['entities']['brightness_shadow'])))
+        # Sensors by name of instance variable. Subscribed in SensorHub only while relevant - see update_subscriptions
+        self.sensor_sources = {}
+        self.sensor_sources['brightness_shadow'] = dict(entity_id=self.params['entities']['brightness_shadow'],
+                                                        callback=self.on_brightness_crossed, thresholds=self.get_brightness_shadow_thresholds,
+                                                        signal_filter=self.get_brightness_filter(),
+                                                        volatility_window=self.get_volatility_window())
         if self.params.get('entities', {}).get("brightness_dawn"):
-            self.brightness_dawn = int(float(self.get_state(self.params['entities']['brightness_dawn'])))
-        if self.params.get('entities', {}).get("window_sensor"):
-            self.window_open = self.get_state(self.params['entities']['window_sensor'])
+            self.sensor_sources['brightness_dawn'] = dict(entity_id=self.params['entities']['brightness_dawn'],
+                                                          callback=self.on_brightness_crossed, thresholds=self.get_brightness_dawn_thresholds,
+                                                          signal_filter=self.get_brightness_filter())
         if self.params['entities'].get('climate'):
-            self.current_temperature = float(self.get_state(self.params['entities']['climate'], attribute="current_temperature"))
+            self.sensor_sources['current_temperature'] = dict(entity_id=self.params['entities']['climate'], attribute="current_temperature", parser=float)
         if self.params['entities'].get('temperature_sensor'):
-            self.current_temperature = float(self.get_state(self.params['entities']['temperature_sensor']))
+            self.sensor_sources['current_temperature'] = dict(entity_id=self.params['entities']['temperature_sensor'], parser=float)
         if self.params['shadow'].get('shadow_brightness_threshold_entity'):
-            self.sunshine_brightness_threshold = int(float(self.get_state(self.params['shadow'].get('shadow_brightness_threshold_entity'))))
+            self.sensor_sources['sunshine_brightness_threshold'] = dict(entity_id=self.params['shadow']['shadow_brightness_threshold_entity'])
+        if self.params.get('entities', {}).get("window_sensor"):
+            self.window_open = self.get_state(self.params['entities']['window_sensor'])
+        if self.weather_alarm_active:
+            # Notified by SensorHub only when alarm threshold or threshold - hysteresis is crossed
+            for name in ('wind_speed', 'rain'):
+                if self.params['entities'].get(name):
+                    self.sensor_sources[name] = dict(entity_id=self.params['entities'][name], parser=alarm_value,
+                                                     callback=self.on_alarm_sensor_crossed,
+                                                     thresholds=lambda name=name: self.get_alarm_thresholds(name))
+
+        # SensorHub keeps one subscription per entity and instance - sources sharing an entity are subscribed together
+        self.sensor_subscriptions = self.merge_sensor_sources()
+
+        # All sensors are read once on initialization to be sure they are available
+        for name in self.sensor_sources:
+            setattr(self, name, None)
+        for _, subscription in self.sensor_subscriptions.values():
+            self.sensor_hub.subscribe(self, **subscription)
+        self.read_sensor_values()
+
+        # Brightness values are mandatory for the logic
+        if self.brightness_shadow is None or self.get_dawn_brightness() is None:
+            raise ValueError("Brightness sensor not available")
+        if self.params['shadow'].get('shadow_brightness_threshold_entity') and self.sunshine_brightness_threshold is None:
+            raise ValueError("Shadow brightness threshold sensor not available")
+
+    def merge_sensor_sources(self):
+        """
+        Combine sensor sources by entity, e.g. when dawn and shadow brightness use the same sensor.
+
+        Returns:
+            Dict (entity_id, attribute) -> (names of sources, arguments for SensorHub.subscribe)
+        """
+        merged = {}
+        for name, source in self.sensor_sources.items():
+            key = (source['entity_id'], source.get('attribute'))
+            if key not in merged:
+                merged[key] = ([name], dict(source))
+                continue
+            names, subscription = merged[key]
+            names.append(name)
+            if source.get('callback') is None:
+                pass
+            elif subscription.get('callback') is None:
+                subscription['callback'], subscription['thresholds'] = source['callback'], source.get('thresholds')
+            else:
+                if subscription['callback'] != source['callback']:
+                    callbacks = (subscription['callback'], source['callback'])
+
+                    def notify_all(entity, old, new, callbacks=callbacks):
+                        for callback in callbacks:
+                            callback(entity, old, new)
+                    subscription['callback'] = notify_all
+                # Notified when a threshold of any source was crossed - without thresholds on every change
+                thresholds = (subscription.get('thresholds'), source.get('thresholds'))
+                subscription['thresholds'] = None if None in thresholds else (
+                    lambda thresholds=thresholds: [threshold for get_thresholds in thresholds for threshold in get_thresholds()])
+            for argument in ('signal_filter', 'volatility_window'):
+                if subscription.get(argument) is None and source.get(argument) is not None:
+                    subscription[argument] = source[argument]
+        return merged
+
+    def read_sensor_values(self):
+        """Take over actual sensor values from shared cache of SensorHub. Last value is kept while a sensor is not available."""
+        for name, source in self.sensor_sources.items():
+            value = self.sensor_hub.value(source['entity_id'], source.get('attribute'), self)
+            if value is not None:
+                setattr(self, name, value)
+        # Derived values are calculated again from the new values
+        self.evaluation.clear()
+
+    def get_relevant_sensors(self):
+        """
+        Sensors which can change a decision in the actual state.
+
+        Returns:
+            Set of sensor names (keys of sensor_sources)
+        """
+        relevant = set()
+        # Shadow handling (brightness and temperature) only applies while facade is in sun
+        shadow = self.params['shadow_active'] and self.sun.in_sun
+        if shadow:
+            relevant.update(('brightness_shadow', 'sunshine_brightness_threshold'))
+            if self.params.get('solar_heating_available') or self.params['shadow'].get('comfort_temperature'):
+                relevant.add('current_temperature')
+        if self.params['dawn_active']:
+            # Without own dawn sensor, shadow brightness is used for dawn
+            relevant.add('brightness_dawn' if 'brightness_dawn' in self.sensor_sources else 'brightness_shadow')
+        if self.weather_alarm_active:
+            # Alarms apply in every state
+            relevant.update(('wind_speed', 'rain'))
+        return relevant
+
+    def update_subscriptions(self):
+        """Subscribe sensors entering relevance and unsubscribe the others. SensorHub reads the actual state on resubscribe."""
+        relevant = self.get_relevant_sensors()
+        for (entity_id, attribute), (names, subscription) in self.sensor_subscriptions.items():
+            # Entity is needed while any source using it is relevant
+            needed = not relevant.isdisjoint(names)
+            subscribed = self.sensor_hub.is_subscribed(self, entity_id, attribute)
+            if needed and not subscribed:
+                try:
+                    self.sensor_hub.subscribe(self, **subscription)
+                except ValueError as e:
+                    self.error(f"Could not subscribe {entity_id}: {e}")
+                    continue
+                self.debug(f"Subscribed {entity_id}")
+            elif not needed and subscribed:
+                self.sensor_hub.unsubscribe(self, entity_id, attribute)
+                self.debug(f"Unsubscribed {entity_id}")
 
     def validate_config(self):
         """Validate configuration and log missing entries."""
@@ -225,10 +487,10 @@ class Shutter(Hass):
         else:
             if not self.params['entities'].get('cover'):
                 self.log(f"Missing mandatory configuration: entities.cover")
-                result = False
+                valid = False
             elif not self.entity_exists(self.params['entities']['cover']):
                 self.log(f"Configuration entity entities.cover: {self.params['entities']['cover']} could not be found in HASS")
-                result = False
+                valid = False
                 
             if not self.params['entities'].get('brightness_shadow'):
                 self.log(f"Missing mandatory configuration: entities.brightness_shadow")
@@ -323,6 +585,59 @@ class Shutter(Hass):
                 self.log("solar_heating.solar_heating_height has to be of type int")
                 valid = False
 
+        if self.params['state_backend'] not in ("file", "sqlite"):
+            self.log("state_backend has to be file or sqlite")
+            valid = False
+
+        if self.params.get('weather_alarm_active'):
+            if not (self.params['entities'].get('wind_speed') or self.params['entities'].get('rain')):
+                self.log("Weather alarm needs entities.wind_speed and/or entities.rain")
+                valid = False
+            for key, value in self.params['weather_alarm'].items():
+                if not isinstance(value, (int, float)):
+                    self.log(f"weather_alarm.{key} has to be a number")
+                    valid = False
+
+        brightness_filter = self.params['brightness_filter']
+        if brightness_filter.get('method') not in FILTER_METHODS:
+            self.log(f"brightness_filter.method has to be one of {', '.join(FILTER_METHODS)}")
+            valid = False
+        if not (type(brightness_filter.get('window')) == int and brightness_filter['window'] >= 1):
+            self.log("brightness_filter.window has to be an int >= 1")
+            valid = False
+        if not (isinstance(brightness_filter.get('percentile'), (int, float)) and 0 <= brightness_filter['percentile'] <= 100):
+            self.log("brightness_filter.percentile has to be between 0 and 100")
+            valid = False
+        if not (isinstance(brightness_filter.get('alpha'), (int, float)) and 0 < brightness_filter['alpha'] <= 1):
+            self.log("brightness_filter.alpha has to be between 0 (excluded) and 1")
+            valid = False
+        if self.params['adaptive_delays_active']:
+            adaptive_delays = self.params['adaptive_delays']
+            if not (type(adaptive_delays.get('volatility_window')) == int and adaptive_delays['volatility_window'] >= 2):
+                self.log("adaptive_delays.volatility_window has to be an int >= 2")
+                valid = False
+            if not (isinstance(adaptive_delays.get('volatility_reference'), (int, float)) and adaptive_delays['volatility_reference'] > 0):
+                self.log("adaptive_delays.volatility_reference has to be a number > 0")
+                valid = False
+            for delay in ADAPTIVE_DELAYS:
+                minimum, maximum = adaptive_delays.get(f"{delay}_min"), adaptive_delays.get(f"{delay}_max")
+                if not (isinstance(minimum, (int, float)) and isinstance(maximum, (int, float)) and 0 <= minimum <= maximum):
+                    self.log(f"adaptive_delays.{delay}_min and _max have to be numbers with 0 <= min <= max")
+                    valid = False
+
+        if not isinstance(self.params['shadow'].get('shadow_brightness_hysteresis'), (int, float)):
+            self.log("shadow.shadow_brightness_hysteresis has to be a number")
+            valid = False
+
+        if self.params['preemption_min_travel'] is not None and not (
+                isinstance(self.params['preemption_min_travel'], (int, float)) and self.params['preemption_min_travel'] >= 0):
+            self.log("preemption_min_travel has to be a number >= 0 or None")
+            valid = False
+
+        if self.params['status_entity'] is not None and not str(self.params['status_entity']).startswith("sensor."):
+            self.log("status_entity has to be a sensor entity id (sensor.xxx)")
+            valid = False
+
         if valid:
             self.debug("Configuration validation successful")
         else:
@@ -439,56 +754,127 @@ class Shutter(Hass):
             self.log(f"IMPORTANT: Stopping logic")
             raise EnvironmentError(f"Exiting logic. Copy lines in file {filepath} to your HASS configuration.yaml first")
 
-        # Register callback for getting state changes from HA
-        self.listen_event(self.listen_internal_entities, event = "call_service")
-
-    def listen_internal_entities(self, event_name, data, kwargs):
-        if data['domain'] == "input_boolean" and (data['service'] == "turn_off" or data['service'] == "turn_on"):
-            # BooleansService data could have a list of entity_ids or just one single string (either called by service or manually switching)
-            # Handling list first
-            if type(data['service_data']['entity_id']) == list:
-                for entity_id in  data['service_data']['entity_id']:
-                    if entity_id in self.input_booleans:
-                        if entity_id == self.name_solar_heating_status:
-                            # This boolean should not be modified from outside. So overwrite with actual state when HASS state differs from internal
-                            if (self.solar_heating_status == STATE_OFF and data['service'] == "turn_on") or (self.solar_heating_status == STATE_ON and data['service'] == "turn_off"):
-                                self.set_state(entity_id=entity_id, state=self.solar_heating_status)
-                        elif data['service'] == "turn_off":
-                            self.log(f"{entity_id} switched off")
-                            self.set_state(entity_id=entity_id, state=STATE_OFF)
-                        elif data['service'] == "turn_on":
-                            self.log(f"{entity_id} switched on")
-                            self.set_state(entity_id=entity_id, state=STATE_ON)
-            elif type(data['service_data']['entity_id']) == str:
-                if data['service_data']['entity_id'] in self.input_booleans:
-                    if data['service_data']['entity_id'] == self.name_solar_heating_status:
-                        # This boolean hould not be modified from outside. So overwrite with actual state
-                        self.set_state(entity_id=data['service_data']['entity_id'], state=self.solar_heating_status)
-                    elif data['service'] == "turn_off":
-                        entity_id = data['service_data']['entity_id']
-                        self.log(f"{data['service_data']['entity_id']} switched off")
-                        self.set_state(entity_id=data['service_data']['entity_id'], state=STATE_OFF)
-                    elif data['service'] == "turn_on":
-                        entity_id = data['service_data']['entity_id']
-                        self.log(f"{data['service_data']['entity_id']} switched on")
-                        self.set_state(entity_id=data['service_data']['entity_id'], state=STATE_ON)
-            else:
-                self.error(f"Couldn't handle service call for input_boolean: {data['service_data']['entity_id']}")
+        # Register callback for getting state changes from HA - one shared call_service listener routes to the owning instance
+        self.service_dispatcher.register(self, self.input_booleans, self.listen_internal_entities)
+
+    def listen_internal_entities(self, entity_id, service):
+        # Called by ServiceDispatcher for turn_on/turn_off service calls of own input_booleans
+        # The service call itself switches the entity in HASS - writing the same state again is suppressed
+        self.publisher.observed(entity_id, STATE_ON if service == "turn_on" else STATE_OFF)
+        if entity_id == self.name_solar_heating_status:
+            # This boolean should not be modified from outside. So overwrite with actual state when HASS state differs from internal
+            if (self.solar_heating_status == STATE_OFF and service == "turn_on") or (self.solar_heating_status == STATE_ON and service == "turn_off"):
+                self.publisher.set(entity_id, self.solar_heating_status)
+        elif service == "turn_off":
+            self.log(f"{entity_id} switched off")
+            self.publisher.set(entity_id, STATE_OFF)
+        elif service == "turn_on":
+            self.log(f"{entity_id} switched on")
+            self.publisher.set(entity_id, STATE_ON)
 
     def schedule_main(self):
-        # schedule main in 30 seconds
+        # Next run of main is planned after every evaluation - interval depends on state (see get_tick_interval)
+        self.handle = None
+        self.tick_at = None
+        self.tick_interval = None
+        self.tick_stats = {"ticks": 0, "fast": 0, "slow": 0}
+        self.tick_started = time.monotonic()
+        self.tick_rate = None
+
+        # Deterministic phase (0...1) of ticks within interval - instances don't evaluate and send commands in the same second.
+        # Instances of same phase group (e.g. covers of one facade) share the phase and still move together
+        key = self.params['phase_group'] or self.params.get('unique_id') or self.name
+        self.phase = zlib.crc32(str(key).encode()) / 2**32
+
+        # First run after (re)start within fast interval
         current = datetime.now()
-        if current.second < 30:
-            run_at = current.replace(second=30, microsecond=0)
-        else:
-            run_at = current.replace(second=0, microsecond=0) + timedelta(minutes=1)
-        self.handle = self.run_every(self.main, run_at, interval=30)
-        self.log("Scheduled main funtion every 30 Seconds")
+        self.tick_interval = self.get_tick_interval()
+        self.tick_at = self.get_next_slot(current, self.params['tick_interval_fast'])
+        self.handle = self.run_in(self.on_tick, (self.tick_at - current).total_seconds())
+        self.log(f"Scheduled main function at {self.tick_at} (phase {round(self.phase * self.params['tick_interval_fast'], 1)} s)")
+
+    def get_next_slot(self, current, interval):
+        """
+        Next tick on the grid of interval shifted by phase of this instance.
+
+        Args:
+            current: Actual time
+            interval: Tick interval in seconds
+
+        Returns:
+            Time of next tick
+        """
+        midnight = current.replace(hour=0, minute=0, second=0, microsecond=0)
+        offset = self.phase * interval
+        seconds = (current - midnight).total_seconds() - offset
+        return midnight + timedelta(seconds=(int(seconds // interval) + 1) * interval + offset)
+
+    def schedule_tick(self):
+        """Plan next run of main. An already planned run is only moved when the new one is due earlier."""
+        interval = self.get_tick_interval()
+        current = self.now
+        run_at = self.get_next_slot(current, interval)
+        # Release of external lock is checked in main
+        if self.shutter_locked_external_till is not None and current < self.shutter_locked_external_till < run_at:
+            run_at = self.shutter_locked_external_till + timedelta(seconds=1)
+        # Automation continues at end of weather alarm hold time
+        if self.weather_alarm_till is not None and current < self.weather_alarm_till < run_at:
+            run_at = self.weather_alarm_till + timedelta(seconds=1)
+        # Evaluate right after predicted arrival of a running command
+        due = self.command_due()
+        if due is not None and current < due < run_at:
+            run_at = due + timedelta(seconds=1)
+
+        if self.tick_at is not None and self.tick_at <= run_at:
+            return
+        if self.handle is not None:
+            self.cancel_timer(self.handle)
+        self.tick_at = run_at
+        self.tick_interval = interval
+        self.handle = self.run_in(self.on_tick, (run_at - current).total_seconds())
+        self.debug(f"Next tick at: {run_at} (interval {interval} s)")
+
+    def get_tick_interval(self):
+        """
+        Interval for next run of main depending on state.
+
+        Fast while something can change without an event (delay timer pending, position change ongoing, sun
+        position changes the shutter position or facade is near a boundary of the sun window). Otherwise all changes
+        are signalled by events and the slow interval is used.
+
+        Returns:
+            Interval in seconds
+        """
+        fast = self.params['tick_interval_fast']
+        if self.timer is not None or self.moving or self.is_command_pending():
+            return fast
+        if self.sun.in_sun or self.is_near_facade_boundary():
+            # Positions follow the sun - temperature features also only apply when in sun
+            return fast
+        return max(fast, min(self.params['tick_interval_slow'], TICK_MAX_INTERVAL))
+
+    def is_near_facade_boundary(self):
+        """Check if sun is near entry/exit or min/max elevation of facade."""
+        facade = self.params['facade']
+        deviation = self.sun.deviation
+        elevation = self.sun.elevation
+        in_window = facade['facade_offset_entry'] - TICK_BOUNDARY_MARGIN <= deviation <= facade['facade_offset_exit'] + TICK_BOUNDARY_MARGIN
+        in_band = facade['min_elevation'] - TICK_BOUNDARY_MARGIN <= elevation <= facade['max_elevation'] + TICK_BOUNDARY_MARGIN
+        near_window = (abs(deviation - facade['facade_offset_entry']) <= TICK_BOUNDARY_MARGIN
+                       or abs(deviation - facade['facade_offset_exit']) <= TICK_BOUNDARY_MARGIN)
+        near_band = (abs(elevation - facade['min_elevation']) <= TICK_BOUNDARY_MARGIN
+                     or abs(elevation - facade['max_elevation']) <= TICK_BOUNDARY_MARGIN)
+        return (near_window and in_band) or (near_band and in_window)
 
     def main(self, *args):
         self.debug("Starting main logic...")
         # This is the function where everything is put together
 
+        # Take over actual sensor values and sun position from shared hubs
+        self.set_sun_snapshot(self.sun_hub.snapshot(self.sun_facade))
+        self.update_subscriptions()
+        self.read_sensor_values()
+
         # Check if an maybe existing external lock could be released
         self.check_external_lock()
 
@@ -524,40 +910,60 @@ class Shutter(Hass):
         self.new_height = self.calculated_height
         
         # Check constraints respecting priority of each constraint (lowest prio first)
+        self.preemption_reason = None
         # ventilation
-        if self.params.get("ventilation_active"):
+        if self.ventilation_active:
             if self.window_open == WINDOW_OPEN:
-                if  type(self.params['ventilation'].get("ventilation_height")) == int:
-                    if self.current_height < self.params['ventilation'].get("ventilation_height"):
+                if self.ventilation_height is not None:
+                    # While moving, the shutter stops at the commanded height
+                    height = self.expected_height if self.moving and self.expected_height is not None else self.current_height
+                    if height is not None and height < self.ventilation_height:
                         # Only open shutter when its more closed than ventialtion height
-                        self.debug(f"Ventilation activated: Current height: {self.current_height} ventialtion height: {self.params['ventilation'].get('ventilation_height')}")
-                        self.new_height = self.params['ventilation'].get("ventilation_height")
+                        self.debug(f"Ventilation activated: Current height: {self.current_height} ventialtion height: {self.ventilation_height}")
+                        self.new_height = self.ventilation_height
+                        self.preemption_reason = "ventilation"
+
+        # Covers without reported position are compared by last commanded height - constraints are skipped when both are unknown
+        height = self.current_height if self.current_height is not None else self.expected_height
 
         # When after dusk, prevent from moving shutter up if configured
-        if self.params['dawn'].get("dawn_prevent_move_up_after_dusk"):
-            if 'next_dusk' in dir(self) and self.next_dusk.replace(tzinfo=None) < datetime.now().replace(tzinfo=None):
+        if self.prevent_move_up_after_dusk:
+            if self.next_dusk is not None and self.next_dusk < self.now:
                 # After dusk, don't move up shutter
-                if self.current_height < self.new_height:
-                    self.debug(f"Prevent from moving shutter up after dusk. Current height: {self.current_height}")
-                    self.new_height = self.current_height
+                if height is not None and height < self.new_height:
+                    self.debug(f"Prevent from moving shutter up after dusk. Current height: {height}")
+                    self.new_height = height
 
         # lockout protection - also when window sensor is unavailable activate lockout protection
-        if self.params.get("lockout_protection_active") and (self.window_open == WINDOW_OPEN or self.window_open == UNAVAILABLE):
-            if self.current_height > self.new_height:
+        if self.lockout_protection_active and (self.window_open == WINDOW_OPEN or self.window_open == UNAVAILABLE):
+            if height is not None and height > self.new_height:
                 # When new height is lower than actual height, do not change height
-                self.new_height = self.current_height
-                self.debug(f"Lockout protection active. Taking over current height. Current height: {self.current_height}")
+                self.new_height = height
+                self.debug(f"Lockout protection active. Taking over current height. Current height: {height}")
+                self.preemption_reason = "lockout protection"
 
         self.debug(f"New calculated height: {self.new_height}")
 
+        if self.shutter_locked == STATE_ON or self.manipulation_active == STATE_ON:
+            self.preemption_reason = "lock"
+
+        # Weather alarm beats every other state, constraint and lock
+        self.check_weather_alarm()
+        if self.is_weather_alarm():
+            self.new_height = self.params['weather_alarm']['weather_alarm_height']
+            self.preemption_reason = "weather alarm"
+            self.debug(f"Weather alarm active: {sorted(self.weather_alarms)} hold till: {self.weather_alarm_till}")
+
         # When everything was checked, move shutter - when not already moving
         if self.moving:
-            self.debug("Shutter already moving - don't set new position")
+            # A running move of this logic is interrupted when a higher priority constraint needs another target
+            if not self.preempt_move():
+                self.debug("Shutter already moving - don't set new position")
         else:
             self.set_position(self.new_height)
 
         # Save state
-        self.save_states_to_file()
+        self.save_states()
 
     def set_position(self, height):
         """Set cover position."""
@@ -571,20 +977,19 @@ class Shutter(Hass):
             self.debug("Shutter already moving - don't set new position")
             return
         
-        # Automated change counter reflects how many state changes happened since last blinds change
-        # When this value equals 0, the logic changed position but no feedback from device has arrived till now (blinds still moving)
-        # Only when last change was finished, a new change should be sent
-        if self.automated_change_counter != 0:
-            # Reset counter when a "real" change arrived
-            self.position_change_ongoing_counter = 0
+        # Weather alarm position is sent regardless of locks and running commands
+        alarm = self.is_weather_alarm()
+        # Only when last change was finished (final position reported or command timed out), a new change should be sent
+        if not self.is_command_pending() or (alarm and not self.is_heading_for(height)):
             # Only write changes to cover entity when not locked in any way
-            if (self.shutter_locked == STATE_OFF
+            if alarm or (self.shutter_locked == STATE_OFF
                 and self.shutter_locked_external == STATE_OFF
                 and self.manipulation_active == STATE_OFF):
                 # Check if height changed to actual shutter height respecting tolerance
                 self.debug(f"Current positions: height: {self.current_height}")
                 tolerance_height = self.params['move_constraints']['height_tolerance']
-                if not (self.current_height <= min((height + tolerance_height), 100) and self.current_height >= max((height - tolerance_height), 0)):
+                if (self.cover_supports(COVER_SUPPORT_SET_POSITION)
+                    and not self.position_matches(self.current_height, height, tolerance_height)):
                     result = self.call_service("cover/set_cover_position",
                                     entity_id=self.params['entities']['cover'],
                                     position=height)
@@ -592,58 +997,372 @@ class Shutter(Hass):
                     if not result['success']:
                         self.error(f"Could not set position to height: {height}")
                     else:
+                        self.record_command_latency()
                         self.debug(f"Set shutter to height: {height}")
-                        self.automated_change_counter = 0
+                        self.register_command(result, height=height)
                         self.expected_height = height
 
         else:
             self.debug(f"Last position change still ongoing.")
-            self.position_change_ongoing_counter += 1
-            if self.position_change_ongoing_counter >= 10:
-                # Seems that a response is missing. Reset states
-                self.position_change_ongoing_counter = 0
-                self.automated_change_counter = 1
         self.debug("set_position finish")
 
+    def preempt_move(self):
+        """
+        Interrupt a running move of this logic when ventilation, lockout protection or a lock needs another target.
+        The cover is stopped and the new target is sent at once instead of after the move and the next tick.
+        A weather alarm also interrupts moves not started by this logic (e.g. manual moves).
+
+        Returns:
+            True when the move was interrupted
+        """
+        if self.preemption_reason is None or self.params['preemption_min_travel'] is None:
+            return False
+        moves = [command for command in self.pending_commands.values() if not command['answered']]
+        if not moves:
+            # Moves not started by this logic are only interrupted by the weather alarm
+            if self.preemption_reason != "weather alarm":
+                return False
+            result = self.stop_cover()
+            if result is None:
+                return False
+            self.log(f"External move interrupted at {self.moving_height} due to weather alarm")
+            self.register_command(result, answered=True)
+            self.moving = False
+            self.current_height = self.moving_height
+            self.set_position(self.new_height)
+            return True
+        if self.expected_height is None or self.moving_height is None:
+            return False
+        if self.preemption_reason != "lock" and self.position_matches(self.new_height, self.expected_height, self.params['move_constraints']['height_tolerance']):
+            # Move already heads for the wanted height
+            return False
+        remaining = abs(self.expected_height - self.moving_height)
+        if remaining < self.params['preemption_min_travel']:
+            self.debug(f"Remaining travel {remaining}% too short - move is not interrupted")
+            return False
+        result = self.stop_cover()
+        if result is None:
+            return False
+        self.log(f"Move to {self.expected_height} interrupted at {self.moving_height} due to {self.preemption_reason}")
+
+        # Travel time saved - estimated by speed of the move so far
+        start = min(moves, key=lambda command: command['sent'])
+        elapsed = (self.now - start['sent']).total_seconds()
+        moved = abs(self.moving_height - start['height']) if start['height'] is not None else 0
+        if elapsed > 0 and moved > 0:
+            self.latency['preemption_saved'].observe(remaining * elapsed / moved)
+
+        # Interrupted move is replaced - stop position is reported with context of the stop command
+        self.pending_commands.clear()
+        self.register_command(result, answered=True)
+        self.moving = False
+        self.current_height = self.moving_height
+        self.set_position(self.new_height)
+        return True
+
+    def is_heading_for(self, height):
+        """Check if the last command (pending or reached) targets this height."""
+        return self.position_matches(self.expected_height, height, self.params['move_constraints']['height_tolerance'])
+
+    def stop_cover(self):
+        """
+        Stop a running move.
+
+        Returns:
+            Result of call_service or None when the cover doesn't support stop or the call failed
+        """
+        if not self.cover_supports(COVER_SUPPORT_STOP):
+            return None
+        result = self.call_service("cover/stop_cover", entity_id=self.params['entities']['cover'])
+        if not result['success']:
+            self.error("Could not stop cover")
+            return None
+        return result
+
+    def read_cover_features(self, attributes=None):
+        """
+        Cache supported features of cover. As long as they are unknown (e.g. cover not available yet) all commands are sent.
+
+        Args:
+            attributes: Attributes of a cover state change - read from HASS when not given
+        """
+        if attributes is None:
+            features = self.get_state(self.params['entities']['cover'], attribute='supported_features')
+        else:
+            features = attributes.get('supported_features')
+        if isinstance(features, int) and features != self.cover_features:
+            self.debug(f"Cover supported features: {features}")
+            self.cover_features = features
+
+    def cover_supports(self, feature):
+        """Check if cover supports a feature (COVER_SUPPORT_*). Unknown features are treated as supported."""
+        return self.cover_features is None or bool(self.cover_features & feature)
+
+    def on_plugin_started(self, event_name, data, kwargs):
+        self.read_cover_features()
+
+    def position_matches(self, current, target, tolerance):
+        """Check if a reported position is within tolerance of target. Unknown positions don't match."""
+        return current is not None and max(target - tolerance, 0) <= current <= min(target + tolerance, 100)
+
+    def register_command(self, result, height=None, answered=False):
+        """
+        Remember a successful cover command. State changes carrying its context id are caused by this logic.
+
+        Args:
+            result: Result of call_service
+            height: Commanded height (None when height is not changed)
+            answered: True for commands without a final position to wait for (e.g. stop)
+        """
+        context_id = ((result.get('result') or {}).get('context') or {}).get('id')
+        # Arrival predicted by learned travel times - a missing response is detected earlier than by COMMAND_TIMEOUT
+        predicted = self.travel_model.predict(self.current_height if height is not None else None, height)
+        timeout = COMMAND_TIMEOUT
+        if predicted is not None:
+            timeout = min(COMMAND_TIMEOUT, timedelta(seconds=predicted * TRAVEL_TIMEOUT_FACTOR + TRAVEL_TIMEOUT_MARGIN))
+        # Without context id the command is attributed by expected position only
+        self.pending_commands[context_id] = {
+            "sent": self.now,
+            "answered": answered,
+            "height": self.current_height,
+            "target_height": height,
+            "due": self.now + timedelta(seconds=predicted) if predicted is not None else None,
+            "deadline": self.now + timeout,
+        }
+        self.last_command = self.now
+
+    def learn_travel(self, command):
+        """Learn travel time from the first settled report at the target of an unanswered own command."""
+        if command.get('learned'):
+            return
+        seconds = (self.now - command['sent']).total_seconds()
+        target = command['target_height']
+        if target is not None:
+            # Height only - a tilt sent together would be part of the measured time
+            if command['height'] is None or not self.position_matches(self.current_height, target, self.params['move_constraints']['height_tolerance']):
+                return
+            self.travel_model.observe("up" if target > command['height'] else "down", abs(target - command['height']), seconds)
+        else:
+            return
+        command['learned'] = True
+        self.debug(f"Learned travel model: {self.travel_model.as_dict()}")
+
+    def command_due(self):
+        """Predicted arrival of the latest running command or None."""
+        due = [command['due'] for command in self.pending_commands.values() if not command['answered'] and command['due'] is not None]
+        return max(due) if due else None
+
+    def expire_commands(self):
+        # Commands without response are given up after timeout
+        if self.pending_commands:
+            self.pending_commands = {context_id: command for context_id, command in self.pending_commands.items()
+                                     if self.now < command['deadline']}
+
+    def is_command_pending(self):
+        """Check if a command was sent and no final position was reported for it yet."""
+        self.expire_commands()
+        return any(not command['answered'] for command in self.pending_commands.values())
+
+    def match_command(self, context_id):
+        """
+        Find the own command a settled cover report belongs to.
+
+        HASS only passes the context of a service call to state writes shortly after the call, so reports at the
+        end of longer moves carry a new context. Besides an equal context id (of this report or of the
+        opening/closing reports of the move), a report counts as response of an unanswered command when it
+        arrives before the deadline of the command and the reported position lies between start and target.
+
+        Args:
+            context_id: Context id of the settled report
+
+        Returns:
+            Pending command or None for an external change
+        """
+        for key in (context_id, self.moving_context):
+            if key is not None and key in self.pending_commands and not self.pending_commands[key]['answered']:
+                return self.pending_commands[key]
+        for command in reversed(list(self.pending_commands.values())):
+            if not command['answered'] and self.now < command['deadline'] and self.on_command_path(command):
+                return command
+        return None
+
+    def on_command_path(self, command):
+        # Reported position lies on the way from start to target of command
+        tolerance_height = self.params['move_constraints']['height_tolerance']
+        return self.position_on_path(self.current_height, command['height'], command['target_height'], tolerance_height)
+
+    def position_on_path(self, current, start, target, tolerance):
+        """
+        Check if a reported position lies between start and target of a command (within tolerance).
+
+        Args:
+            current: Reported position (None when not reported)
+            start: Position when command was sent (None when not known)
+            target: Commanded position (None when this position was not changed by the command)
+            tolerance: Tolerance in percent
+        """
+        if current is None or target is None:
+            # Not reported or not commanded (e.g. tilt of blinds changes with height)
+            return True
+        if start is None:
+            return self.position_matches(current, target, tolerance)
+        return min(start, target) - tolerance <= current <= max(start, target) + tolerance
+
             
+    def trigger_main(self):
+        """Evaluate immediately instead of waiting for next run of main. Used by callbacks of shared hubs."""
+        # Processed on own thread of this app - callbacks of shared hubs run on the thread of another app
+        self.mailbox.post("wake")
+
+    def on_tick(self, kwargs):
+        # Clock reading for planning the next tick - evaluation reads it again in process_messages
+        self.now = datetime.now()
+        self.handle = None
+        self.tick_at = None
+        self.tick_stats['ticks'] += 1
+        self.tick_stats['fast' if self.tick_interval <= self.params['tick_interval_fast'] else 'slow'] += 1
+        # Effective ticks per hour since start
+        self.tick_rate = round(self.tick_stats['ticks'] * 3600 / max(time.monotonic() - self.tick_started, 1), 1)
+        self.debug(f"Tick rate: {self.tick_rate} per hour ({self.tick_stats})")
+        # Plan next tick right away (also when evaluation fails) - evaluation may move it earlier
+        self.schedule_tick()
+        self.mailbox.post("tick")
+
+    def is_lockout_trigger(self, window_state):
+        # Window/door opened (or sensor unavailable) while lockout protection is active
+        return self.lockout_protection_active and window_state != WINDOW_CLOSED
+
+    def process_messages(self, messages, posted):
+        """Apply all messages drained from mailbox and run main once."""
+        self.now = datetime.now()
+        # Writes of internal input_booleans are sent once after the evaluation
+        with self.publisher:
+            evaluate = False
+            self.trigger_urgent = False
+            self.trigger_alarm = False
+            for (kind, key), value in messages.items():
+                if kind == "state":
+                    self.apply_state_change(key, value)
+                    evaluate = True
+                elif kind == "window":
+                    self.window_open = value
+                    self.trigger_urgent = self.is_lockout_trigger(value)
+                    evaluate = True
+                elif kind == "alarm":
+                    self.trigger_urgent = True
+                    self.trigger_alarm = True
+                    evaluate = True
+                elif kind == "cover":
+                    # Key of not coalesced messages is (entity, sequence)
+                    self.apply_cover_change(key[0], value)
+                else:
+                    # tick, timer expiry, sun transition, brightness crossing
+                    evaluate = True
+
+            # Oldest event of this batch - ticks and cover feedback are no triggers
+            triggers = [posted_at for (kind, _), posted_at in posted.items() if kind not in ("tick", "cover")]
+            self.trigger_posted_at = min(triggers) if triggers else None
+
+            # Until initialization is finished, the scheduled run of main will do the evaluation
+            if evaluate and self.ready:
+                # Measures how many instances evaluate at the same time
+                with EVALUATIONS:
+                    self.main()
+                # State may need a faster tick now
+                self.schedule_tick()
+            self.trigger_posted_at = None
+
+            if self.ready:
+                self.report_status()
+
+    def report_status(self):
+        """Report compact status to the aggregated status entity. Unchanged status is not written again."""
+        if not self.params['status_entity']:
+            return
+        self.fleet_status.report(self, self.params['status_entity'], self.params.get('unique_id') or self.name, {
+            "state": self.shutter_state,
+            "height": self.current_height,
+            "target_height": self.expected_height,
+            "locked": self.shutter_locked,
+            "locked_external": self.shutter_locked_external,
+            "locked_external_till": self.shutter_locked_external_till.isoformat(timespec='seconds') if self.shutter_locked_external_till else None,
+            "manipulation_active": self.manipulation_active,
+            "weather_alarm": self.is_weather_alarm(),
+            **self.get_adaptive_delays_status(),
+            "last_command": self.last_command.isoformat(timespec='seconds') if self.last_command else None,
+            "travel_model": self.travel_model.as_dict(),
+        }, self.get_metrics())
+
+    def get_metrics(self):
+        # Measurements published with the aggregated status - changes alone don't cause a write
+        return {
+            "latency": {name: histogram.as_dict() for name, histogram in self.latency.items() if histogram.count},
+            "tick_rate": self.tick_rate,
+            "ticks": dict(self.tick_stats),
+            "publisher": dict(self.publisher.stats),
+        }
+
+    def record_command_latency(self):
+        """Record latency from trigger to first command of this evaluation."""
+        if self.trigger_posted_at is None:
+            return
+        latency = time.monotonic() - self.trigger_posted_at
+        self.trigger_posted_at = None
+        self.latency["alarm" if self.trigger_alarm else "urgent" if self.trigger_urgent else "trigger"].observe(latency)
+        self.debug(f"Trigger to command latency: {round(latency * 1000)} ms")
+
+    def start_timer(self, seconds):
+        """Start delay timer. Expiry is signalled by the shared TimerService."""
+        self.timer = self.now + timedelta(seconds = int(seconds))
+        self.debug(f"Timer finish at: {self.timer}")
+        self.timer_service.arm(self, self.name, self.timer, self.on_timer_expired)
+
+    def stop_timer(self):
+        self.timer = None
+        self.timer_service.cancel(self.name)
+
+    def on_timer_expired(self, keys):
+        """Called by TimerService when delay timer expired."""
+        self.debug(f"Timer expired: {self.timer}")
+        self.trigger_main()
+
     def is_timer_finished(self):
         if self.timer is None:
             return True
-        elif self.timer < datetime.now():
+        elif self.timer < self.now:
             return True
         else:
             return False
     
     def get_dawn_brightness(self):
         # Dawn brightness could either be a separate entity - or as fallback use shadow brightness entity
-        if self.params['entities'].get("brightness_dawn"):
+        if self.has_dawn_sensor:
             return self.brightness_dawn
         else:
             return self.brightness_shadow
 
     def calculate_sun_deviation(self):
-        # Normalize the difference between sun and facade angle to -180...+180
-        angle_diff = round((self.azimuth - self.params['facade']['facade_angle']) % 360, 2)
-        if angle_diff > 180:
-            angle_diff = round(angle_diff - 360, 2)
-        return angle_diff
+        # Difference between sun and facade angle normalized to -180...+180 - already calculated by SunHub
+        return self.sun.deviation
 
     def in_sun(self):
-        """Calculate if facade is in sun."""
+        """Calculate if facade is in sun. Calculated once per run of main."""
+        in_sun = self.evaluation.get('in_sun')
+        if in_sun is not None:
+            return in_sun
+
         # Calculate absolute deviation between sun azimuth and facade angle
         angle_diff = self.calculate_sun_deviation()
         
         # Check if sun is in configured range
         sun_entry = self.params['facade']['facade_offset_entry']
         sun_exit = self.params['facade']['facade_offset_exit']
-        
-        # Check elevation
-        if not (self.params['facade']['min_elevation'] <= self.elevation <= self.params['facade']['max_elevation']):
-            return False
 
         self.debug(f"Sun angle relative to facade: {angle_diff} (Entry: {sun_entry}, Exit: {sun_exit})")
-        
-        return sun_entry <= angle_diff <= sun_exit
+
+        # Elevation and azimuth range are already checked by the facade index of SunHub
+        in_sun = self.evaluation['in_sun'] = self.sun.in_sun
+        return in_sun
 
     def calculate_height(self):
         """Calculate shutter height for light strip."""
@@ -656,7 +1375,9 @@ class Shutter(Hass):
         if ( not self.params.get('shadow', {}).get('light_strip') ) or self.params['shadow']['light_strip'] == 0:
             height_pct = 0
         else:
-            height = round(self.params['shadow']['light_strip'] * math.tan(math.radians(self.elevation)))
+            height = self.evaluation.get('light_strip_height')
+            if height is None:
+                height = self.evaluation['light_strip_height'] = round(self.params['shadow']['light_strip'] * math.tan(math.radians(self.elevation)))
             height_pct = 100 - round(height * 100 / self.params['shadow']['total_height'])
 
         # Apply min/max constraints from config
@@ -675,14 +1396,14 @@ class Shutter(Hass):
             if self.solar_heating_active == STATE_ON:
                 # Only when facade is in sun, solar heating status should be on
                 if not self.in_sun() and self.solar_heating_status == STATE_ON:
-                    self.set_state(self.name_solar_heating_status, STATE_OFF)
+                    self.publisher.set(self.name_solar_heating_status, STATE_OFF)
                 elif self.current_temperature > self.params['solar_heating']['solar_heating_temperature']:
                     # Current Temperature above wanted temperature -> No more solar heating
                     self.hysterese_reached = True
                     # Update status
                     if self.solar_heating_status == STATE_ON:
                         self.solar_heating_status = STATE_OFF
-                        self.set_state(self.name_solar_heating_status, STATE_OFF)
+                        self.publisher.set(self.name_solar_heating_status, STATE_OFF)
                         self.debug("Temperature reached and above threshold. Solar heating status OFF.")
                 else:
                     if self.hysterese_reached:
@@ -692,19 +1413,19 @@ class Shutter(Hass):
                             self.hysterese_reached = False
                             if self.solar_heating_status == STATE_OFF:
                                 self.solar_heating_status = STATE_ON
-                                self.set_state(self.name_solar_heating_status, STATE_ON)
+                                self.publisher.set(self.name_solar_heating_status, STATE_ON)
                                 self.debug("Temperature below threshold. Solar heating status ON.")
                     else:
                         # Hysterese not reached upfront, so do solar heating
                         if self.solar_heating_status == STATE_OFF:
                             self.solar_heating_status = STATE_ON
-                            self.set_state(self.name_solar_heating_status, STATE_ON)
+                            self.publisher.set(self.name_solar_heating_status, STATE_ON)
                             self.debug("Temperature below threshold. Solar heating status ON.")
             else:
                 # check that status boolean has state off
                 if self.solar_heating_status == STATE_ON:
                     self.solar_heating_status = STATE_OFF
-                    self.set_state(self.name_solar_heating_status, STATE_OFF)
+                    self.publisher.set(self.name_solar_heating_status, STATE_OFF)
                     self.debug("Solar heating not active. Solar heating status OFF.")
             
             self.debug(f"Solar heating active: {self.solar_heating_active} - Solar heating status: {self.solar_heating_status}")
@@ -713,22 +1434,20 @@ class Shutter(Hass):
         # Reset solar heating status if switched on
         if self.solar_heating_status == STATE_ON:
             self.solar_heating_status = STATE_OFF
-            self.set_state(self.name_solar_heating_status, STATE_OFF)
+            self.publisher.set(self.name_solar_heating_status, STATE_OFF)
 
     def check_external_lock(self):
         if self.shutter_locked_external == STATE_ON:
             # sanity check if shutter locked external on but no Timestamp, set back to off
             if self.shutter_locked_external_till is None:
                 self.debug("Method check_external_lock no time found. Setting to off")
-                self.set_state(entity_id=self.name_shutter_locked_external, state=STATE_OFF)
-                # Read entity to be in sync with HASS
-                self.shutter_locked_external = self.get_state(entity_id=self.name_shutter_locked_external)
-            elif datetime.now() > self.shutter_locked_external_till:
+                self.publisher.set(self.name_shutter_locked_external, STATE_OFF)
+                self.shutter_locked_external = STATE_OFF
+            elif self.now > self.shutter_locked_external_till:
                 # reset lock
                 self.debug("Method check_external_lock time is up. Setting to off")
-                self.set_state(entity_id=self.name_shutter_locked_external, state=STATE_OFF)
-                # Read entity to be in sync with HASS
-                self.shutter_locked_external = self.get_state(entity_id=self.name_shutter_locked_external)
+                self.publisher.set(self.name_shutter_locked_external, STATE_OFF)
+                self.shutter_locked_external = STATE_OFF
                 self.shutter_locked_external_till = None
 
     def get_shadow_brightness_threshold(self):
@@ -739,6 +1458,86 @@ class Shutter(Hass):
         else:
             return self.params['shadow']['shadow_brightness_threshold']
 
+    def get_shadow_brightness_threshold_off(self):
+        # Brightness has to fall below this value to leave shadow - between both thresholds the state is kept
+        threshold = self.get_shadow_brightness_threshold()
+        if threshold is None:
+            return None
+        return threshold - self.params['shadow']['shadow_brightness_hysteresis']
+
+    def get_volatility_window(self):
+        """Number of brightness samples for the volatility of SensorHub or None when delays are fixed."""
+        if not self.params['adaptive_delays_active']:
+            return None
+        return self.params['adaptive_delays']['volatility_window']
+
+    def get_volatility_index(self):
+        """
+        Volatility of shadow brightness (0 = steady light ... 1 = broken clouds).
+
+        Returns:
+            Coefficient of variation of the last brightness samples relative to volatility_reference (limited to 1)
+            or None when not known yet
+        """
+        volatility = self.sensor_hub.volatility(self.params['entities']['brightness_shadow'],
+                                                 self.params['adaptive_delays']['volatility_window'])
+        if volatility is None:
+            return None
+        return min(1.0, volatility / self.params['adaptive_delays']['volatility_reference'])
+
+    def get_delay(self, delay):
+        """
+        Effective delay in seconds. With adaptive delays, delays of ADAPTIVE_DELAYS are scaled between their
+        min (steady light) and max (volatile light) - otherwise the configured delay is used.
+
+        Args:
+            delay: Name of delay in delays block
+        """
+        if self.params['adaptive_delays_active'] and delay in ADAPTIVE_DELAYS:
+            index = self.get_volatility_index()
+            if index is not None:
+                minimum = self.params['adaptive_delays'][f"{delay}_min"]
+                maximum = self.params['adaptive_delays'][f"{delay}_max"]
+                return minimum + (maximum - minimum) * index
+        return self.params['delays'][delay]
+
+    def get_adaptive_delays_status(self):
+        # Volatility and effective delays for tuning - only published when adaptive delays are active
+        if not self.params['adaptive_delays_active']:
+            return {}
+        index = self.get_volatility_index()
+        return {
+            "volatility_index": round(index, 2) if index is not None else None,
+            "effective_delays": {delay: round(self.get_delay(delay)) for delay in ADAPTIVE_DELAYS},
+        }
+
+    def get_brightness_filter(self):
+        """Filter arguments for brightness sensors in SensorHub or None for raw values."""
+        if self.params['brightness_filter']['method'] == "raw":
+            return None
+        return dict(self.params['brightness_filter'])
+
+    def get_brightness_shadow_thresholds(self):
+        # Thresholds where a change of shadow brightness can change a decision - used by SensorHub
+        thresholds = []
+        if self.params['shadow_active']:
+            if self.params['shadow'].get('shadow_brightness_threshold_entity'):
+                thresholds.append(self.sensor_hub.value(self.params['shadow']['shadow_brightness_threshold_entity']))
+            else:
+                thresholds.append(self.params['shadow']['shadow_brightness_threshold'])
+            if self.params['shadow']['shadow_brightness_hysteresis']:
+                thresholds.append(self.get_shadow_brightness_threshold_off())
+        if self.params['dawn_active'] and not self.params['entities'].get("brightness_dawn"):
+            # Shadow brightness is also used for dawn handling
+            thresholds.append(self.params['dawn']['dawn_brightness_threshold'])
+        return thresholds
+
+    def get_brightness_dawn_thresholds(self):
+        # Thresholds where a change of dawn brightness can change a decision - used by SensorHub
+        if self.params['dawn_active']:
+            return [self.params['dawn']['dawn_brightness_threshold']]
+        return []
+
     def calc_stepping_height(self, height):
         """ calculate height fitting step width """
         if self.params['move_constraints']['height_step'] != 0 and (height % self.params['move_constraints']['height_step']) != 0:
@@ -749,7 +1548,7 @@ class Shutter(Hass):
             if self.brightness_shadow > self.get_shadow_brightness_threshold():
                 # Brightness again above threshold - move back to shadow
                 self.debug("Brightness above threshold. Switching from SHADOW_TO HORIZONTAL_TIMER back to SHADOW")
-                self.timer = None
+                self.stop_timer()
                 return self.STATE_SHADOW
             elif self.is_timer_finished():
                 # Timer is over, move to neutral
@@ -761,18 +1560,17 @@ class Shutter(Hass):
         else:
             # When facade no longer in sun change to neutral
             self.debug("Facade no longer in sun. Switching to NEUTRAL")
-            self.timer = None
+            self.stop_timer()
             return self.STATE_NEUTRAL
 
     def handle_state_shadow(self):
         if self.in_sun() and self.params['shadow_active']:
             # Check if solar heating should be active
             self.check_solar_heating()
-            if self.brightness_shadow < self.get_shadow_brightness_threshold():
+            if self.brightness_shadow < self.get_shadow_brightness_threshold_off():
                 # Brightness below threshold - start timer for moving to horizontal
                 self.debug("Brightness below threshold. Switching from SHADOW to SHADOW_TO_NEUTRAL_TIMER")
-                self.timer = datetime.now() + timedelta(seconds = int(self.params['delays']['shadow_to_neutral_delay']))
-                self.debug(f"Timer finish at: {self.timer}")
+                self.start_timer(self.get_delay('shadow_to_neutral_delay'))
                 return self.STATE_SHADOW_TO_NEUTRAL_TIMER
             else:
                 return self.STATE_SHADOW
@@ -783,14 +1581,14 @@ class Shutter(Hass):
 
     def handle_state_neutral_to_shadow_timer(self):
         if self.in_sun() and self.params['shadow_active']:
-            if self.brightness_shadow < self.get_shadow_brightness_threshold():
+            if self.brightness_shadow < self.get_shadow_brightness_threshold_off():
                 # Brightness below threshold - go back to neutral
                 self.debug("Brightness below threshold. Switching from NEUTRAL_TO_SHADOW_TIMER back to NEUTRAL")
-                self.timer = None
+                self.stop_timer()
                 return self.STATE_NEUTRAL
             elif self.is_timer_finished():
                 self.debug("Timer finished. Switching from NEUTRAL_TO_SHADOW_TIMER to SHADOW")
-                self.timer = None
+                self.stop_timer()
                 return self.STATE_SHADOW
             else:
                 # nothing to change
@@ -798,7 +1596,7 @@ class Shutter(Hass):
         else:
             # When facade no longer in sun change to neutral
             self.debug("Facade no longer in sun. Switching to NEUTRAL")
-            self.timer = None
+            self.stop_timer()
             return self.STATE_NEUTRAL
     
     def handle_state_neutral(self):
@@ -807,15 +1605,13 @@ class Shutter(Hass):
         if self.params['dawn_active'] and (self.get_dawn_brightness() < self.params['dawn']['dawn_brightness_threshold']):
             # Separate dawn object and brightness below threshold - start neutral to dawn timer
             self.debug("Brightness below dawn threshold. Switching from NEUTRAL to NEUTRAL_TO_DAWN_TIMER")
-            self.timer = datetime.now() + timedelta(seconds = int(self.params['delays']['neutral_to_dawn_delay']))
-            self.debug(f"Timer finish at: {self.timer}")
+            self.start_timer(self.params['delays']['neutral_to_dawn_delay'])
             return self.STATE_NEUTRAL_TO_DAWN_TIMER
         elif self.in_sun() and self.params['shadow_active']:
             if self.brightness_shadow > self.get_shadow_brightness_threshold():
                 # Brightness above threshold - start timer for moving to horizontal
                 self.debug("Brightness above threshold. Switching from NEUTRAL to NEUTRAL_TO_SHADOW_TIMER")
-                self.timer = datetime.now() + timedelta(seconds = self.params['delays']['neutral_to_shadow_delay'])
-                self.debug(f"Timer finish at: {self.timer}")
+                self.start_timer(self.get_delay('neutral_to_shadow_delay'))
                 return self.STATE_NEUTRAL_TO_SHADOW_TIMER
             else:
                 # nothing to change
@@ -829,18 +1625,18 @@ class Shutter(Hass):
             if self.get_dawn_brightness() > self.params['dawn'].get("dawn_brightness_threshold"):
                 # Brightness again avove threshold - back to neutral
                 self.debug("Brightness above threshold. Switching from NEUTRAL_TO_DAWN_TIMER back to NEUTRAL")
-                self.timer = None
+                self.stop_timer()
                 self.shutter_state = self.STATE_NEUTRAL
             elif self.is_timer_finished():
                 self.debug("Timer NEUTRAL_TO_DAWN_TIMER finished. Switching to DAWN")
-                self.timer = None
+                self.stop_timer()
                 return self.STATE_DAWN
             else:
                 # nothing to change
                 return self.shutter_state
         else:
             self.debug("Dawn handling no longer active. Switching to NEUTRAL")
-            self.timer = None
+            self.stop_timer()
             return self.STATE_NEUTRAL
 
     def handle_state_dawn(self):
@@ -848,8 +1644,7 @@ class Shutter(Hass):
             if self.get_dawn_brightness() > self.params['dawn']['dawn_brightness_threshold']:
                 # Brightness below threshold - start timer for moving to horizontal
                 self.debug("Brightness above threshold. Switching from DAWN to DAWN_TO_NEUTRAL_TIMER")
-                self.timer = datetime.now() + timedelta(seconds = int(self.params['delays']['dawn_to_neutral_delay']))
-                self.debug(f"Timer finish at: {self.timer}")
+                self.start_timer(self.params['delays']['dawn_to_neutral_delay'])
                 return self.STATE_DAWN_TO_NEUTRAL_TIMER
             else:
                 # nothing to change
@@ -864,7 +1659,7 @@ class Shutter(Hass):
             if self.get_dawn_brightness() < self.params['dawn']['dawn_brightness_threshold']:
                 # Brightness again below threshold - move back to dawn
                 self.debug("Brightness below threshold. Switching from DAWN_TO_NEUTRAL_TIMER back to DAWN")
-                self.timer = None
+                self.stop_timer()
                 return self.STATE_DAWN
             elif self.is_timer_finished():
                 # Timer is over, move to neutral
@@ -876,7 +1671,7 @@ class Shutter(Hass):
         else:
             # When facade no longer in sun change to neutral
             self.debug("Dawn handling no longer active. Switching to NEUTRAL")
-            self.timer = None
+            self.stop_timer()
             return self.STATE_NEUTRAL
         
     def handle_states(self):
@@ -899,24 +1694,34 @@ class Shutter(Hass):
             case _:
                 self.error(f"handle_states: Unknown state: {self.shutter_state}")
 
-    def on_sun_change(self, entity, attribute, old, new, kwargs):
-        """Stores changes in instance variable."""
-        self.debug(f"Sun change triggered: {new=}")
-        if new in [None, UNKNOWN, UNAVAILABLE]:
+    def set_sun_snapshot(self, snapshot):
+        """Stores sun snapshot of SunHub in instance variables."""
+        if snapshot is None:
             return
-        
-        self.azimuth = new['attributes']['azimuth']
-        self.elevation  = new['attributes']['elevation']
-        self.next_dusk  = datetime.fromisoformat(new['attributes']['next_dusk'])
-        if self.in_sun():
-            self.debug(f"Facade is in sun")
-        else:
-            self.debug(f"Facade is NOT in sun")
+
+        if snapshot is self.sun:
+            # Snapshot is shared until sun changes - nothing new
+            return
+        self.sun = snapshot
+        self.azimuth = snapshot.azimuth
+        self.elevation = snapshot.elevation
+        # Compared with local time in main
+        self.next_dusk = snapshot.next_dusk.replace(tzinfo=None) if snapshot.next_dusk else None
+
+    def on_sun_transition(self, snapshot):
+        """Called by SunHub when facade entered or left the sun. Runs on the thread of another app."""
+        self.debug(f"Sun change triggered: facade {'is' if snapshot.in_sun else 'is NOT'} in sun")
+        # Snapshot is taken over by main on own thread
+        self.trigger_main()
 
     def on_state_change(self, entity, attribute, old, new, kwargs):
         if new is None:
             return
+        self.mailbox.post("state", entity, new)
+
+    def apply_state_change(self, entity, new):
         self.debug(f"input_boolean {entity} changed: {new}")
+        self.publisher.observed(entity, new)
         if entity == self.name_shutter_locked:
             self.shutter_locked = new
         elif entity == self.name_shutter_locked_external:
@@ -925,89 +1730,136 @@ class Shutter(Hass):
                 self.shutter_locked_external_till = None
             else:
                 if self.shutter_locked_external_till is None:
-                    self.shutter_locked_external_till = datetime.now() + timedelta(minutes=self.params['shutter_locked_external_for_min'])
+                    self.shutter_locked_external_till = self.now + timedelta(minutes=self.params['shutter_locked_external_for_min'])
         elif entity == self.name_manipulation_active:
             self.manipulation_active = new
         elif entity == self.name_solar_heating_active:
             self.solar_heating_active = new
         elif entity == self.name_debug_active:
             self.debug_active = new
-        # Call main to change immediately
-        self.main()
 
-    def on_brightness_shadow_change(self, entity, attribute, old, new, kwargs):
-        """Handle changes in brightness."""
-        self.debug(f"Brightness shadow change triggered: {entity=}, {old=}, {new=}")
-        if new in [None, UNKNOWN, UNAVAILABLE]:
+    def on_brightness_crossed(self, entity, old, new):
+        """Called by SensorHub when brightness crossed a threshold of this instance."""
+        self.debug(f"Brightness threshold crossed: {entity=}, {old=}, {new=}")
+        self.trigger_main()
+
+    def on_alarm_sensor_crossed(self, entity, old, new):
+        """Called by SensorHub when a weather alarm sensor crossed its threshold. Evaluated without debounce window."""
+        self.debug(f"Weather alarm sensor crossed: {entity=}, {old=}, {new=}")
+        self.mailbox.post("alarm", entity, new, urgent=True)
+
+    def get_alarm_thresholds(self, name):
+        # Thresholds where a weather alarm sensor can switch the alarm on (threshold) or off (threshold - hysteresis)
+        threshold = self.params['weather_alarm'][f'{name}_threshold']
+        return [threshold, threshold - self.params['weather_alarm'][f'{name}_hysteresis']]
+
+    def check_weather_alarm(self):
+        """
+        Update weather alarm from wind and rain sensors. An alarm is raised at the threshold and cleared below
+        threshold - hysteresis. Automation stays locked for the hold time after all alarms cleared.
+        """
+        if not self.weather_alarm_active:
             return
-        self.brightness_shadow = int(float(new))
-
-    def on_sunshine_brightness_threshold_change(self, entity, attribute, old, new, kwargs):
-        """Handle change of Sunshine Brightness Threshold Sensor Change"""
-        self.debug(f"Sunshine Brightness Threshold Sensor change triggered: {entity=}, {old=}, {new=}")
-        if new in [None, UNKNOWN, UNAVAILABLE]:
-            return
-        self.debug(f"Updating internal sunshine_brightness_threshold to: {new}")
-        self.sunshine_brightness_threshold = int(float(new))
-
-    def on_brightness_dawn_change(self, entity, attribute, old, new, kwargs):
-        """Handle changes in brightness."""
-        self.debug(f"Brightness dawn change triggered: {entity=}, {old=}, {new=}")
-        if new in [None, UNKNOWN, UNAVAILABLE]:
-            return
-        self.brightness_dawn = int(float(new))
-
+        alarms = set()
+        for name in ('wind_speed', 'rain'):
+            source = self.sensor_sources.get(name)
+            if source is None:
+                continue
+            value = self.sensor_hub.value(source['entity_id'])
+            threshold, threshold_off = self.get_alarm_thresholds(name)
+            if value is None:
+                # Sensor not available - keep last state
+                if name in self.weather_alarms:
+                    alarms.add(name)
+            elif value >= threshold or (name in self.weather_alarms and value > threshold_off):
+                alarms.add(name)
+        if alarms and not self.weather_alarms:
+            self.log(f"Weather alarm: {', '.join(sorted(alarms))}")
+        elif self.weather_alarms and not alarms:
+            self.weather_alarm_till = self.now + timedelta(minutes=self.params['weather_alarm']['weather_alarm_hold_min'])
+            self.log(f"Weather alarm cleared - automation locked till: {self.weather_alarm_till}")
+        if alarms:
+            self.weather_alarm_till = None
+        elif self.weather_alarm_till is not None and self.now >= self.weather_alarm_till:
+            self.weather_alarm_till = None
+        self.weather_alarms = alarms
+
+    def is_weather_alarm(self):
+        """Check if a weather alarm is active or its hold time is running."""
+        return bool(self.weather_alarms) or self.weather_alarm_till is not None
 
     def on_window_change(self, entity, attribute, old, new, kwargs):
         """Handle changes for window."""
         self.debug(f"Window change triggered: {entity=}, {old=}, {new=}")
-        if new in [None, UNKNOWN, UNAVAILABLE]:
+        if new in INVALID_STATES:
             return
-        self.window_open = new
-        # Update positions immediately
-        self.main()
-
-    def on_temperature_change(self, entity, attribute, old, new, kwargs):
-        """Handle changes on temperature."""
-        self.debug(f"Current temperature change triggered: {entity=}, {old=}, {new=}")
-        if new in [None, UNKNOWN, UNAVAILABLE]:
-            return
-        else:
-            self.current_temperature = float(new)
+        # Update positions immediately - opening with lockout protection is safety relevant and skips debounce window
+        urgent = self.is_lockout_trigger(new)
+        self.mailbox.post("window", entity, new, urgent=urgent)
 
     def on_cover_change(self, entity, attribute, old, new, kwargs):
+        # Every cover event counts for detection of external changes - so don't coalesce
+        self.mailbox.post("cover", entity, new, coalesce=False)
+
+    def apply_cover_change(self, entity, new):
         # logic for handling changes
         # self.debug(f"Cover change triggered: {entity=}, {attribute=}, {old=}, {new=}")
-        if new is None or new['state'] in ["opening", "closing", UNKNOWN, UNAVAILABLE]:
+        if new is None or new['state'] in COVER_NOT_SETTLED:
+            if new is not None:
+                self.moving_height = new['attributes'].get('current_position')
+                context_id = (new.get('context') or {}).get('id')
+                if context_id is not None and context_id in self.pending_commands:
+                    self.moving_context = context_id
             # Filtering these states. Maybe it's a manual trigger or triggered by this logic
             self.moving = True
             return
         else:
             self.moving = False
-            self.debug(f"Cover changed: {entity=}, {attribute=}, {old=}, {new=}")
-            # Raise self.automated_change_counter by one
-            self.automated_change_counter += 1
-            self.debug(f"Automated Change Counter: {self.automated_change_counter}")
+            self.moving_height = None
+            self.debug(f"Cover changed: {entity=}, {new=}")
+
+            # Attribute change by its context id to own commands
+            self.expire_commands()
+            context_id = (new.get('context') or {}).get('id')
 
             # Set new values to variables
-            self.current_height = new['attributes']['current_position']
+            self.read_cover_features(new['attributes'])
+            self.current_height = new['attributes'].get('current_position')
+            command = self.match_command(context_id)
+            if command is not None:
+                self.debug("Change caused by own command")
 
             # Check position
             tolerance_height = self.params['move_constraints']['height_tolerance']
 
             # Check height/position
-            height_matches = (self.expected_height is None or 
-                                (self.current_height <= min((self.expected_height + tolerance_height), 100) and 
-                                self.current_height >= max((self.expected_height - tolerance_height), 0)))
+            height_matches = (self.expected_height is None or self.current_height is None
+                              or self.position_matches(self.current_height, self.expected_height, tolerance_height))
+
+            # Learn from unanswered commands whose target was reached - matched by position, as the final report
+            # of a move longer than a few seconds carries a new context id
+            for pending in self.pending_commands.values():
+                if not pending['answered']:
+                    self.learn_travel(pending)
+            if None in self.pending_commands:
+                # Command without context id - any final position is the response
+                self.pending_commands[None]['answered'] = True
 
             if height_matches:
                 self.debug("Change matches expected automated change")
                 # Check if the curent event could be related to an automated cover change
-                if self.automated_change_counter <= self.max_automated_change_counter:
+                if self.pending_commands:
+                    # Final position of own commands reached
+                    for pending in self.pending_commands.values():
+                        pending['answered'] = True
+                    self.moving_context = None
                     # Reset external lock timer
                     self.shutter_locked_external_till = None
                     # Check if an maybe existing external lock could be released
                     self.check_external_lock()
+            elif command is not None:
+                # Devices may report intermediate positions while moving - command stays pending till final position
+                self.debug("Intermediate position of own command - no external change")
             else:
                 self.debug("Change doesn't match expected automated change - set external lock")
                 # Logic when manual change detected - when aleady locked by any other lock no external lock detection
@@ -1017,18 +1869,16 @@ class Shutter(Hass):
                         # Set lock directly - communication with HASS maybe take some time and lead to issues
                         self.shutter_locked_external = STATE_ON
                         # Update timer
-                        self.shutter_locked_external_till = datetime.now() + timedelta(minutes=self.params['shutter_locked_external_for_min'])
+                        self.shutter_locked_external_till = self.now + timedelta(minutes=self.params['shutter_locked_external_for_min'])
                         # AFTER timer update, also change state of input_boolean
-                        self.set_state(entity_id=self.name_shutter_locked_external, state=STATE_ON)
-                        # Sync State with HASS
-                        self.shutter_locked_external = self.get_state(entity_id=self.name_shutter_locked_external)
+                        self.publisher.set(self.name_shutter_locked_external, STATE_ON)
                         
                         self.debug(f"External lock set to: {self.shutter_locked_external} timer set to: {self.shutter_locked_external_till}")
                     else:
                         self.debug(f"Already locked by external change till: {self.shutter_locked_external_till}")
 
-    def save_states_to_file(self):
-        """Save current states to JSON file with timestamp."""
+    def save_states(self):
+        """Save current states with timestamp to configured backend."""
         if not self.params['save_states']:
             # Don't save states
             return
@@ -1037,11 +1887,23 @@ class Shutter(Hass):
             return
 
         state_data = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": self.now.isoformat(),
             "state": self.shutter_state,
-            "timer": self.timer.isoformat() if self.timer else None
+            "timer": self.timer.isoformat() if self.timer else None,
+            "locked_external_till": self.shutter_locked_external_till.isoformat() if self.shutter_locked_external_till else None,
+            "expected_height": self.expected_height,
+            "hysterese_reached": self.hysterese_reached,
+            "travel_model": self.travel_model.as_dict()
         }
-        
+
+        if self.params['state_backend'] == "sqlite":
+            self.state_store.save(self.params['unique_id'], state_data)
+        else:
+            # File is written by background thread - latest state per instance wins
+            self.state_writer.submit(self.params['unique_id'], self.save_states_to_file, state_data)
+
+    def save_states_to_file(self, state_data):
+        """Save states to JSON file. Runs on the StateWriter thread."""
         try:
             filename = f"states_{self.params['unique_id']}.json"
             filepath = os.path.join(self.app_dir, filename)
@@ -1051,35 +1913,56 @@ class Shutter(Hass):
         except Exception as e:
             self.error(f"Failed to save state: {e}")
 
-    def load_state_from_file(self):
-        """Load states from JSON file if not older than 1 hour."""
+    def load_states(self):
+        """Load states from configured backend if not older than 1 hour."""
         if not self.params['unique_id']:
             self.debug("No file suffix defined. No saved states.")
-            return
+            return False
+        if self.params['state_backend'] == "sqlite":
+            # One database for all instances in app directory
+            self.state_store.open(os.path.join(self.app_dir, "states.db"))
         try:
-            filename = f"states_{self.params['unique_id']}.json"
-            filepath = os.path.join(self.app_dir, filename)
-            
-            if not os.path.exists(filepath):
-                self.debug(f"No state file found for {self.params['unique_id']}")
+            if self.params['state_backend'] == "sqlite":
+                state_data = self.state_store.load(self.params['unique_id'])
+            else:
+                state_data = self.load_state_from_file()
+            if state_data is None:
+                self.debug(f"No saved state found for {self.params['unique_id']}")
                 return False
-                
-            with open(filepath, 'r') as f:
-                state_data = json.load(f)
-                
+
+            # Learned travel times don't get outdated
+            self.travel_model.restore(state_data.get('travel_model'))
+
             # Check timestamp
             saved_time = datetime.fromisoformat(state_data['timestamp'])
             if datetime.now() - saved_time > timedelta(minutes=60):
-                self.debug(f"State file too old ({saved_time}), not loading")
+                self.debug(f"Saved state too old ({saved_time}), not loading")
                 return False
-                
+
             # Restore states
             self.shutter_state = state_data['state']
             self.timer = datetime.fromisoformat(state_data['timer']) if state_data['timer'] else None
-            
-            self.debug(f"Loaded state from {filename} (saved at {saved_time})")
+            # Not available in states saved by older versions
+            self.hysterese_reached = state_data.get('hysterese_reached', False)
+            # Last commanded position and running external lock - a restart neither repeats commands nor releases the lock
+            self.expected_height = state_data.get('expected_height')
+            if state_data.get('locked_external_till'):
+                self.shutter_locked_external_till = datetime.fromisoformat(state_data['locked_external_till'])
+
+            self.debug(f"Loaded state (saved at {saved_time})")
             return True
-            
+
         except Exception as e:
             self.error(f"Failed to load state: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    def load_state_from_file(self):
+        """Read states from JSON file. Returns None when no file exists."""
+        filename = f"states_{self.params['unique_id']}.json"
+        filepath = os.path.join(self.app_dir, filename)
+
+        if not os.path.exists(filepath):
+            return None
+
+        with open(filepath, 'r') as f:
+            return json.load(f)
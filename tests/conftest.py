@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import hass_stub
+
+hass_stub.install()
+
+import blinds
+import shutter
+from helpers.entity_collector import EntityCollector
+from helpers.fleet_status import FleetStatus
+from helpers.sensor_hub import SensorHub
+from helpers.service_dispatcher import ServiceDispatcher
+from helpers.state_store import StateStore
+from helpers.state_writer import StateWriter
+from helpers.sun_hub import SunHub
+from helpers.timer_service import TimerService
+
+SINGLETONS = (EntityCollector, FleetStatus, SensorHub, ServiceDispatcher, StateStore, StateWriter, SunHub, TimerService)
+
+FACADE = {"facade_angle": 180, "facade_offset_entry": -80, "facade_offset_exit": 80, "min_elevation": 0, "max_elevation": 90}
+
+
+@pytest.fixture(autouse=True)
+def fresh_singletons():
+    """Shared hubs are singletons - every test starts with new ones."""
+    for cls in SINGLETONS:
+        cls._instance = None
+    yield
+    for cls in SINGLETONS:
+        cls._instance = None
+
+
+def tick(app):
+    """Deliver one tick through the mailbox consumer, like on_tick does."""
+    app.process_messages({("tick", None): None}, {("tick", None): time.monotonic()})
+
+
+def settle(app):
+    """Report the last commanded position as reached - following ticks are in steady state."""
+    attributes = {"current_position": app.expected_height, "supported_features": 255}
+    if getattr(app, "expected_angle", None) is not None:
+        attributes["current_tilt_position"] = app.expected_angle
+    app.process_messages({("cover", ("cover.test", 0)): {"state": "open", "attributes": attributes, "context": {"id": None}}},
+                         {("cover", ("cover.test", 0)): time.monotonic()})
+
+
+def make_blinds(tmp_path, states=None, **args):
+    """
+    Blinds instance with facade in sun and brightness above threshold.
+
+    Args:
+        tmp_path: Directory of app
+        states: Additional entity states
+        args: Override the configuration
+    """
+    all_states = hass_stub.make_states("test_blinds", ("blinds_locked", "blinds_locked_external", "manipulation_active",
+                                                       "debug_active"), brightness=80000, azimuth=180, elevation=30)
+    all_states.update(states or {})
+    app = blinds.Blinds("test_blinds", {
+        "unique_id": "test_blinds",
+        "name": "Test",
+        "entities": {"cover": "cover.test", "brightness_shadow": "sensor.brightness"},
+        "facade": FACADE,
+        "solar_heating_available": False,
+        **args,
+    }, all_states, str(tmp_path))
+    app.initialize()
+    return app
+
+
+@pytest.fixture
+def blinds_app(tmp_path):
+    """Blinds instance in shadow."""
+    app = make_blinds(tmp_path)
+    app.blinds_state = app.STATE_SHADOW
+    return app
+
+
+def make_shutter(tmp_path, states=None, **args):
+    """
+    Shutter instance with facade in sun and brightness above threshold.
+
+    Args:
+        tmp_path: Directory of app
+        states: Additional entity states
+        args: Override the configuration
+    """
+    all_states = hass_stub.make_states("test_shutter", ("shutter_locked", "shutter_locked_external", "manipulation_active",
+                                                        "debug_active"), brightness=80000, azimuth=180, elevation=30)
+    all_states.update(states or {})
+    app = shutter.Shutter("test_shutter", {
+        "unique_id": "test_shutter",
+        "name": "Test",
+        "entities": {"cover": "cover.test", "brightness_shadow": "sensor.brightness"},
+        "facade": FACADE,
+        "solar_heating_available": False,
+        **args,
+    }, all_states, str(tmp_path))
+    app.initialize()
+    return app
+
+
+@pytest.fixture
+def shutter_app(tmp_path):
+    """Shutter instance in shadow."""
+    app = make_shutter(tmp_path)
+    app.shutter_state = app.STATE_SHADOW
+    return app
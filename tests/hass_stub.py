@@ -0,0 +1,107 @@
+"""Minimal stand-in for the AppDaemon Hass API - enough to initialize blinds and shutter apps and run main."""
+import itertools
+import sys
+import types
+from datetime import datetime, timedelta
+
+
+class Hass:
+    """
+    Hass API backed by a dict of entity states. Listeners and timers are only recorded, nothing runs on its own.
+    """
+
+    def __init__(self, name: str, args: dict, states: dict, app_dir: str):
+        """
+        Args:
+            name: Name of app
+            args: Configuration of app (apps.yaml)
+            states: entity_id -> {"state": ..., "attributes": {...}} - shared by all apps of a test
+            app_dir: Directory for saved states and generated configuration
+        """
+        self.name = name
+        self.args = args
+        self.states = states
+        self.app_dir = app_dir
+        self.handles = itertools.count(1)
+        self.service_calls = []
+
+    def log(self, msg, *args, **kwargs):
+        pass
+
+    def error(self, msg, *args, **kwargs):
+        pass
+
+    def entity_exists(self, entity_id):
+        return entity_id in self.states
+
+    def get_state(self, entity_id=None, attribute=None, default=None, **kwargs):
+        entity = self.states.get(entity_id)
+        if entity is None:
+            return default
+        if attribute == "all":
+            return entity
+        if attribute is None:
+            return entity['state']
+        return entity['attributes'].get(attribute, default)
+
+    def set_state(self, entity_id, state=None, attributes=None, **kwargs):
+        entity = self.states.setdefault(entity_id, {"state": None, "attributes": {}})
+        entity['state'] = state
+        if attributes:
+            entity['attributes'].update(attributes)
+        return entity
+
+    def call_service(self, service, **kwargs):
+        self.service_calls.append((service, kwargs))
+        return {"success": True, "result": {"context": {"id": f"{self.name}-{len(self.service_calls)}"}}}
+
+    def listen_state(self, callback, entity_id=None, **kwargs):
+        return next(self.handles)
+
+    def cancel_listen_state(self, handle):
+        pass
+
+    def listen_event(self, callback, event=None, **kwargs):
+        return next(self.handles)
+
+    def run_in(self, callback, delay, **kwargs):
+        return next(self.handles)
+
+    def cancel_timer(self, handle):
+        pass
+
+
+def install():
+    """Register the stub as appdaemon.plugins.hass.hassapi - used when AppDaemon is not installed."""
+    names = ("appdaemon", "appdaemon.plugins", "appdaemon.plugins.hass", "appdaemon.plugins.hass.hassapi")
+    for name in names:
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["appdaemon.plugins.hass.hassapi"].Hass = Hass
+
+
+def boolean(state="off"):
+    return {"state": state, "attributes": {}}
+
+
+def make_states(unique_id: str, booleans: tuple, brightness: int, azimuth: float, elevation: float) -> dict:
+    """
+    States of HASS for one instance: cover, brightness sensor, sun and the internal input_booleans.
+
+    Args:
+        unique_id: unique_id of instance
+        booleans: Suffixes of the internal input_booleans
+        brightness: State of brightness sensor
+        azimuth: Azimuth of sun
+        elevation: Elevation of sun
+    """
+    states = {
+        "cover.test": {"state": "open", "attributes": {"current_position": 100, "current_tilt_position": 100,
+                                                       "supported_features": 255}},
+        "sensor.brightness": {"state": str(brightness), "attributes": {}},
+        "sun.sun": {"state": "above_horizon", "attributes": {
+            "azimuth": azimuth, "elevation": elevation,
+            "next_dusk": (datetime.now() + timedelta(hours=6)).isoformat()}},
+    }
+    for suffix in booleans:
+        states[f"input_boolean.{unique_id}_{suffix}"] = boolean()
+    return states
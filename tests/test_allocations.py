@@ -0,0 +1,41 @@
+import tracemalloc
+
+import pytest
+
+from conftest import settle, tick
+
+# Peak of memory allocated while one steady-state tick runs (bytes)
+MAX_TICK_PEAK = 16 * 1024
+# Memory kept after steady-state ticks (bytes) - allowance for tracemalloc bookkeeping, no growth per tick
+MAX_RETAINED = 4 * 1024
+TICKS = 50
+
+
+@pytest.mark.parametrize("fixture", ["blinds_app", "shutter_app"])
+def test_steady_state_tick_allocations(request, fixture):
+    app = request.getfixturevalue(fixture)
+    tick(app)
+    settle(app)
+    # Warm up caches (sun snapshot, evaluation context, filters) before measuring
+    for _ in range(5):
+        tick(app)
+
+    calls = len(app.service_calls)
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        peak = 0
+        for _ in range(TICKS):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            tick(app)
+            _, tick_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, tick_peak - before)
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Steady state: nothing is sent
+    assert len(app.service_calls) == calls
+    assert peak <= MAX_TICK_PEAK, f"Steady-state tick allocated {peak} bytes at peak"
+    assert end - start <= MAX_RETAINED, f"{end - start} bytes retained after {TICKS} ticks"
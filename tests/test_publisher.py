@@ -0,0 +1,77 @@
+from hass_stub import Hass
+
+from helpers.publisher import Publisher
+
+
+class App(Hass):
+    """Hass stub which records reconcile timers and lets writes of chosen entities fail or get lost."""
+
+    def __init__(self, states):
+        super().__init__("test", {}, states, "")
+        self.timers = []
+        self.failing = set()
+        self.lost = set()
+        self.reads = 0
+
+    def debug(self, msg):
+        pass
+
+    def run_in(self, callback, delay, **kwargs):
+        self.timers.append(callback)
+        return super().run_in(callback, delay, **kwargs)
+
+    def set_state(self, entity_id, state=None, attributes=None, **kwargs):
+        if entity_id in self.failing:
+            raise ConnectionError("HASS not reachable")
+        if entity_id in self.lost:
+            return None
+        return super().set_state(entity_id, state, attributes, **kwargs)
+
+    def get_state(self, entity_id=None, attribute=None, default=None, **kwargs):
+        self.reads += 1
+        return super().get_state(entity_id, attribute, default, **kwargs)
+
+
+def make_publisher():
+    app = App({"input_boolean.a": {"state": "off", "attributes": {}}, "input_boolean.b": {"state": "off", "attributes": {}}})
+    publisher = Publisher(app)
+    publisher.observed("input_boolean.a", "off")
+    publisher.observed("input_boolean.b", "off")
+    return app, publisher
+
+
+def test_confirmed_writes_are_not_read_back():
+    app, publisher = make_publisher()
+    publisher.set("input_boolean.a", "on")
+    assert app.states["input_boolean.a"]["state"] == "on"
+    assert app.timers == []
+    assert app.reads == 0
+
+
+def test_failed_write_is_reconciled():
+    app, publisher = make_publisher()
+    app.failing.add("input_boolean.a")
+    with publisher:
+        publisher.set("input_boolean.a", "on")
+        publisher.set("input_boolean.b", "on")
+    assert publisher.stats["failed"] == 1
+    assert len(app.timers) == 1
+
+    app.failing.clear()
+    app.timers.pop()()
+    # Only the failed entity is read back and written again
+    assert app.reads == 1
+    assert app.states["input_boolean.a"]["state"] == "on"
+    assert publisher.stats["reconciled"] == 1
+
+
+def test_unconfirmed_write_reported_by_hass_is_not_read_back():
+    app, publisher = make_publisher()
+    app.lost.add("input_boolean.a")
+    publisher.set("input_boolean.a", "on")
+    assert len(app.timers) == 1
+
+    # State change of the entity arrives before the reconcile timer
+    publisher.observed("input_boolean.a", "on")
+    app.timers.pop()()
+    assert app.reads == 0
@@ -0,0 +1,37 @@
+import math
+
+import pytest
+
+from conftest import settle, tick
+
+TRIG_FUNCTIONS = ("sin", "atan", "tan")
+
+
+def count_trig_calls(monkeypatch, app, ticks=3):
+    """Run ticks and count calls of trig functions per tick."""
+    per_tick = []
+    for _ in range(ticks):
+        counts = dict.fromkeys(TRIG_FUNCTIONS, 0)
+        for name in TRIG_FUNCTIONS:
+            def counted(x, name=name, function=getattr(math, name)):
+                counts[name] += 1
+                return function(x)
+            monkeypatch.setattr(math, name, counted)
+        tick(app)
+        monkeypatch.undo()
+        per_tick.append(counts)
+    return per_tick
+
+
+@pytest.mark.parametrize("fixture", ["blinds_app", "shutter_app"])
+def test_trig_calls_per_tick_are_constant(request, monkeypatch, fixture):
+    app = request.getfixturevalue(fixture)
+    tick(app)
+    settle(app)
+
+    per_tick = count_trig_calls(monkeypatch, app)
+
+    # Derived values are calculated once per evaluation - no repeated in_sun/deviation/angle calculation
+    assert all(counts == per_tick[0] for counts in per_tick)
+    assert all(count <= 1 for count in per_tick[0].values())
+    assert sum(per_tick[0].values()) >= 1
@@ -0,0 +1,14 @@
+import pytest
+
+from conftest import make_shutter
+
+
+@pytest.mark.parametrize("reference", [0, -0.5])
+def test_shutter_rejects_volatility_reference_not_positive(tmp_path, reference):
+    with pytest.raises(ValueError, match="Configuration validation failed"):
+        make_shutter(tmp_path, adaptive_delays_active=True, adaptive_delays={"volatility_reference": reference})
+
+
+def test_shutter_accepts_adaptive_delays(tmp_path):
+    app = make_shutter(tmp_path, adaptive_delays_active=True, adaptive_delays={"volatility_reference": 0.5})
+    assert app.get_delay("neutral_to_shadow_delay") is not None
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from conftest import make_blinds, make_shutter, tick
+
+WIND = {"sensor.wind": {"state": "80", "attributes": {}}}
+ALARM = {
+    "weather_alarm_active": True,
+    "weather_alarm": {"weather_alarm_height": 0, "weather_alarm_angle": 100},
+    "entities": {"cover": "cover.test", "brightness_shadow": "sensor.brightness", "wind_speed": "sensor.wind"},
+}
+
+
+def make_app(kind, tmp_path, position=100):
+    states = dict(WIND)
+    states["cover.test"] = {"state": "open", "attributes": {"current_position": position, "current_tilt_position": 100,
+                                                            "supported_features": 255}}
+    factory = make_blinds if kind == "blinds" else make_shutter
+    return factory(tmp_path, states=states, **ALARM)
+
+
+def report_cover(app, state, position, context_id):
+    message = {"state": state, "attributes": {"current_position": position, "current_tilt_position": 100,
+                                              "supported_features": 255}, "context": {"id": context_id}}
+    app.process_messages({("cover", ("cover.test", 1)): message}, {("cover", ("cover.test", 1)): time.monotonic()})
+
+
+@pytest.mark.parametrize("kind", ["blinds", "shutter"])
+def test_alarm_position_is_sent_once_while_pending(tmp_path, kind):
+    app = make_app(kind, tmp_path)
+    tick(app)
+    sent = list(app.service_calls)
+    assert ("cover/set_cover_position", {"entity_id": "cover.test", "position": 0}) in sent
+
+    # Cover did not report the alarm position yet - command is not repeated
+    tick(app)
+    tick(app)
+    assert app.service_calls == sent
+
+
+@pytest.mark.parametrize("kind", ["blinds", "shutter"])
+def test_alarm_interrupts_manual_move(tmp_path, kind):
+    app = make_app(kind, tmp_path, position=0)
+    tick(app)
+    assert app.service_calls == []
+
+    # Cover is moved up manually while the alarm is active
+    report_cover(app, "opening", 30, "manual")
+    tick(app)
+    # Blinds set the tilt again after the height
+    assert [service for service, _ in app.service_calls][:2] == ["cover/stop_cover", "cover/set_cover_position"]
+    assert app.service_calls[1][1]["position"] == 0